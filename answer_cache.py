@@ -0,0 +1,91 @@
+# Cache semântico de respostas do chat
+# Guarda (embedding da pergunta, chunks usados, resposta). Uma pergunta nova com similaridade de cosseno
+# >= threshold com uma guardada recebe a mesma resposta sem busca nem LLM ("o que é ndvi" e "O que
+# significa NDVI?"), desde que a versão do índice seja a mesma de quando a resposta foi gerada, a
+# entrada não tenha passado do ttl e a rota da pergunta (índices, talhões e mês citados) seja igual: o
+# embedding sozinho não separa "O que é SAVI?" de "O que é OSAVI?". Qualquer escrita na coleção muda a versão, então não há invalidação
+# por chunk; o tamanho é limitado por LRU e invalidate apaga tudo.
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import normalize_question
+
+# Metadados que identificam os chunks de uma resposta
+CHUNK_ID_FIELDS = ("source", "doc_type", "row_id", "content_hash")
+
+def unit_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticAnswerCache:
+    def __init__(self, embeddings, max_entries=512, threshold=0.9, ttl=86400.0):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        # chave (pergunta normalizada) -> entrada; a ordem é a do uso mais recente
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Entrada mais parecida da mesma versão do índice e da mesma rota, ou None; o embedding vem do cache
+    # de perguntas
+    def lookup(self, question, version, route=None):
+        vector = unit_vector(self.embeddings.embed_query(question))
+        now = time.monotonic()
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry["version"] != version or now - entry["created"] >= self.ttl]:
+                del self.entries[key]
+            best = None
+            keys = [key for key, entry in self.entries.items() if entry["route"] == route]
+            if keys:
+                similarities = np.stack([self.entries[key]["vector"] for key in keys]) @ vector
+                index = int(similarities.argmax())
+                if similarities[index] >= self.threshold:
+                    self.entries.move_to_end(keys[index])
+                    best = {**self.entries[keys[index]], "similarity": float(similarities[index])}
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+
+    def store(self, question, version, answer, documents, route=None):
+        entry = {
+            "question": question,
+            "vector": unit_vector(self.embeddings.embed_query(question)),
+            "answer": answer,
+            "chunks": [{field: doc.metadata.get(field) for field in CHUNK_ID_FIELDS} for doc in documents],
+            "version": version,
+            "route": route,
+            "created": time.monotonic(),
+        }
+        with self.lock:
+            key = normalize_question(question)
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    # Apaga todas as respostas
+    def invalidate(self):
+        with self.lock:
+            removed = len(self.entries)
+            self.entries.clear()
+            return removed
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries),
+            }
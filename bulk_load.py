@@ -0,0 +1,67 @@
+# Carga em massa no Milvus a partir de arquivos colunares
+# Em vez de inserts gRPC linha a linha, os chunks (texto, vetor e metadados) são gravados em arquivos
+# NumPy ou Parquet no bucket do MinIO usado pelo Milvus, e o Milvus importa os arquivos com
+# bulk_insert, montando os segmentos direto. O progresso das tarefas de importação é acompanhado até o fim.
+#
+# Depende do bulk_writer do pymilvus (pip install "pymilvus[bulk_writer]" nas versões 2.4+).
+
+import time
+
+from pymilvus import BulkInsertState, utility
+
+try:
+    from pymilvus.bulk_writer import BulkFileType, RemoteBulkWriter
+except ImportError:
+    BulkFileType = None
+    RemoteBulkWriter = None
+
+class MilvusBulkLoader:
+    def __init__(self, collection, endpoint, access_key, secret_key, bucket, remote_path="rag_bulk", file_type="npy", secure=False):
+        if RemoteBulkWriter is None:
+            raise RuntimeError("A carga em massa precisa do bulk_writer do pymilvus: pip install \"pymilvus[bulk_writer]\".")
+        self.collection = collection
+        # auto_id: o pk é gerado pelo Milvus e não vai nos arquivos
+        self.fields = [field.name for field in collection.schema.fields if not field.auto_id]
+        self.writer = RemoteBulkWriter(
+            schema=collection.schema,
+            remote_path=remote_path,
+            connect_param=RemoteBulkWriter.S3ConnectParam(
+                endpoint=endpoint,
+                access_key=access_key,
+                secret_key=secret_key,
+                bucket_name=bucket,
+                secure=secure,
+            ),
+            file_type=BulkFileType.PARQUET if file_type == "parquet" else BulkFileType.NUMPY,
+        )
+        self.rows = 0
+
+    # Acrescenta os chunks com os vetores já calculados, na mesma ordem
+    def append(self, chunks, vectors):
+        for chunk, vector in zip(chunks, vectors):
+            row = {"text": chunk.page_content, "vector": vector, **chunk.metadata}
+            self.writer.append_row({name: row[name] for name in self.fields})
+        self.rows += len(chunks)
+
+    # Envia os arquivos pendentes, dispara uma importação por lote de arquivos e espera todas terminarem
+    def commit(self, poll_interval=5.0):
+        self.writer.commit()
+        name = self.collection.name
+        tasks = [utility.do_bulk_insert(collection_name=name, files=files) for files in self.writer.batch_files]
+        print(f"[INFO] {self.rows} chunks em {len(tasks)} importações para '{name}'.")
+        pending = set(tasks)
+        while pending:
+            time.sleep(poll_interval)
+            imported = 0
+            for task_id in tasks:
+                state = utility.get_bulk_insert_state(task_id)
+                imported += state.row_count
+                if task_id not in pending:
+                    continue
+                if state.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+                    raise RuntimeError(f"Importação {task_id} em '{name}' falhou: {state.failed_reason}")
+                if state.state == BulkInsertState.ImportCompleted:
+                    pending.discard(task_id)
+            print(f"[INFO] Importação: {imported}/{self.rows} linhas, {len(tasks) - len(pending)}/{len(tasks)} tarefas concluídas.")
+        utility.wait_for_index_building_complete(name)
+        return self.rows
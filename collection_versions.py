@@ -0,0 +1,71 @@
+# Coleções versionadas atrás de um alias do Milvus (troca blue/green)
+# Cada reconstrução cria <alias>_v<timestamp>; o retriever e a ingestão usam sempre o nome do alias,
+# que o Milvus resolve a cada requisição. Depois que a nova versão está indexada, carregada e conferida,
+# o alias passa a apontar para ela numa única operação e as versões antigas são apagadas.
+
+import time
+
+from pymilvus import Collection, utility
+from pymilvus.client.types import LoadState
+
+from milvus_schema import search_params
+
+def new_version_name(alias):
+    return f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+# Versões existentes do alias, da mais antiga para a mais nova
+def list_versions(alias):
+    prefix = f"{alias}_v"
+    return sorted(name for name in utility.list_collections() if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+# Coleção para a qual o alias aponta hoje (None se o alias não existir)
+def current_version(alias):
+    for name in list_versions(alias):
+        if alias in utility.list_aliases(name):
+            return name
+    return None
+
+# Confere se a nova versão pode receber tráfego: índice pronto, coleção carregada, entidades
+# suficientes em relação à versão atual e uma busca de teste respondida
+def verify_version(name, previous=None, min_ratio=0.5):
+    collection = Collection(name)
+    collection.flush()
+    utility.wait_for_index_building_complete(name)
+    if utility.load_state(name) != LoadState.Loaded:
+        collection.load()
+    entities = collection.num_entities
+    if entities == 0:
+        raise RuntimeError(f"A versão '{name}' está vazia.")
+    if previous is not None:
+        previous_entities = Collection(previous).num_entities
+        if entities < previous_entities * min_ratio:
+            raise RuntimeError(
+                f"A versão '{name}' tem {entities} entidades, menos de {min_ratio:.0%} das {previous_entities} de '{previous}'."
+            )
+    vector_field = next(field for field in collection.schema.fields if field.name == "vector")
+    probe = [[0.0] * (vector_field.params["dim"] - 1) + [1.0]]
+    index = next(index for index in collection.indexes if index.field_name == "vector")
+    collection.search(probe, "vector", search_params(index.params["index_type"], index.params["metric_type"]), limit=1)
+    return entities
+
+# Aponta o alias para a versão; uma coleção antiga com o nome do alias (criada antes das versões)
+# precisa ser apagada antes, porque alias e coleção não podem ter o mesmo nome
+def switch_alias(alias, name):
+    if current_version(alias) is not None:
+        utility.alter_alias(name, alias)
+        return
+    if utility.has_collection(alias):
+        print(f"[WARN] Apagando a coleção '{alias}' sem versão para criar o alias; buscas falham por alguns instantes.")
+        utility.drop_collection(alias)
+    utility.create_alias(name, alias)
+
+# Apaga as versões que não são a atual nem estão entre as keep anteriores mais novas
+def gc_versions(alias, keep=1):
+    current = current_version(alias)
+    older = [name for name in list_versions(alias) if name != current and (current is None or name < current)]
+    stale = older[:len(older) - keep] if keep > 0 else older
+    for name in stale:
+        Collection(name).release()
+        utility.drop_collection(name)
+        print(f"[INFO] Versão antiga '{name}' apagada.")
+    return stale
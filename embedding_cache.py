@@ -0,0 +1,176 @@
+# Cache persistente de embeddings em SQLite, chaveado por (modelo, tipo, sha256 do texto)
+# Envolve qualquer Embeddings do LangChain: só os textos que ainda não estão no cache vão para o modelo.
+# Os vetores ficam como float32 num BLOB. O arquivo tem no máximo max_entries vetores; ao passar do
+# limite, os menos usados recentemente saem. Documentos e consultas são guardados separadamente,
+# porque o Ollama recebe prefixos diferentes ("passage: " / "query: ") em cada caso.
+#
+# O modelo deve identificar também o cliente quando os vetores mudam com ele (ex.: "nomic-embed-text@batch").
+#
+# QueryEmbeddingCache é uma camada em memória (LRU com TTL) só para as perguntas do chat, na frente do
+# cliente de embeddings usado pelo retriever.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (model, kind, text_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+# Limite de parâmetros por consulta do SQLite em versões antigas é 999
+LOOKUP_BATCH = 500
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, model, path=".rag_state/embeddings.sqlite", max_entries=200_000):
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # A mesma conexão é usada pela thread principal e pela do modo watch, sempre sob self.lock;
+        # o WAL permite que o rag.py e o indexer.py usem o mesmo arquivo ao mesmo tempo
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA_SQL)
+        self.count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _lookup(self, kind, hashes):
+        found = {}
+        for i in range(0, len(hashes), LOOKUP_BATCH):
+            batch = hashes[i:i + LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND kind = ? AND text_hash IN ({placeholders})",
+                (self.model, kind, *batch),
+            )
+            for digest, blob in rows:
+                found[digest] = array("f", blob).tolist()
+        if found:
+            now = time.time_ns()
+            self.conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND kind = ? AND text_hash = ?",
+                [(now, self.model, kind, digest) for digest in found],
+            )
+            self.conn.commit()
+        return found
+
+    def _store(self, kind, vectors):
+        now = time.time_ns()
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (model, kind, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(self.model, kind, digest, array("f", vector).tobytes(), now) for digest, vector in vectors.items()],
+        )
+        self.count += max(cursor.rowcount, 0)
+        if self.count > self.max_entries:
+            # Remove um pouco além do excesso para não ter de despejar a cada lote
+            excess = self.count - self.max_entries + self.max_entries // 10
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE (model, kind, text_hash) IN "
+                "(SELECT model, kind, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.conn.commit()
+
+    # Busca no cache, calcula só os textos que faltam (cada texto distinto uma única vez) e guarda o resultado
+    def _embed(self, kind, texts, compute):
+        hashes = [text_hash(text) for text in texts]
+        with self.lock:
+            cached = self._lookup(kind, list(set(hashes)))
+            missed = sum(1 for digest in hashes if digest not in cached)
+            self.hits += len(hashes) - missed
+            self.misses += missed
+        missing = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in cached:
+                missing.setdefault(digest, text)
+        if missing:
+            computed = dict(zip(missing, compute(list(missing.values()))))
+            with self.lock:
+                self._store(kind, computed)
+            cached.update(computed)
+        return [cached[digest] for digest in hashes]
+
+    def embed_documents(self, texts):
+        return self._embed("document", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        total = self.hits + self.misses
+        if total:
+            print(f"[INFO] Cache de embeddings: {self.hits}/{total} acertos ({self.hit_rate():.1%}), "
+                  f"{self.count} vetores em '{self.path}'.")
+
+# "  O que é NDVI? " e "o que é ndvi?" viram a mesma chave
+def normalize_question(text):
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip().casefold()
+
+class QueryEmbeddingCache(Embeddings):
+    def __init__(self, embeddings, max_entries=1024, ttl=3600.0):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Documentos passam direto (inserções do modo watch usam o mesmo vectorstore)
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_question(text)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        with self.lock:
+            self.entries[key] = (now, vector)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return vector
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
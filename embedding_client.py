@@ -0,0 +1,103 @@
+# Cliente de embeddings do Ollama com lotes e requisições concorrentes
+# Usa o endpoint /api/embed, que aceita uma lista de textos por requisição, e mantém no máximo
+# max_in_flight requisições assíncronas em andamento. Os vetores voltam na ordem de entrada e lotes
+# que falham são repetidos com backoff exponencial. Substitui o OllamaEmbeddings do
+# langchain_community em Milvus.from_documents, add_documents e nas buscas do retriever.
+#
+# Atenção: o /api/embed devolve vetores normalizados, diferente do /api/embeddings usado pelo
+# OllamaEmbeddings; uma coleção criada com um cliente deve ser consultada com o mesmo cliente.
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+# Executa a corrotina mesmo quando já existe um event loop rodando nesta thread
+def run_sync(coro):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+class BatchOllamaEmbeddings(Embeddings):
+    def __init__(
+        self,
+        model="nomic-embed-text",
+        base_url="http://localhost:11434",
+        batch_size=64,
+        max_in_flight=4,
+        max_retries=3,
+        retry_backoff=0.5,
+        timeout=120.0,
+        embed_instruction="passage: ",
+        query_instruction="query: ",
+    ):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        # Mesmos prefixos do OllamaEmbeddings do langchain_community
+        self.embed_instruction = embed_instruction
+        self.query_instruction = query_instruction
+        self._client = None
+
+    def _payload(self, texts):
+        return {"model": self.model, "input": texts}
+
+    def _parse(self, response, texts):
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Ollama devolveu {len(embeddings)} vetores para {len(texts)} textos.")
+        return embeddings
+
+    async def _aembed_batch(self, client, semaphore, texts):
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await client.post(f"{self.base_url}/api/embed", json=self._payload(texts))
+                    return self._parse(response, texts)
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    if attempt == self.max_retries:
+                        raise RuntimeError(f"Falha ao gerar embeddings de um lote de {len(texts)} textos: {e}") from e
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def _aembed(self, texts):
+        if not texts:
+            return []
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            # gather preserva a ordem dos lotes, mesmo que terminem fora de ordem
+            results = await asyncio.gather(*(self._aembed_batch(client, semaphore, batch) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
+    async def aembed_documents(self, texts):
+        return await self._aembed([self.embed_instruction + text for text in texts])
+
+    async def aembed_query(self, text):
+        return (await self._aembed([self.query_instruction + text]))[0]
+
+    def embed_documents(self, texts):
+        return run_sync(self.aembed_documents(texts))
+
+    # Consultas usam um cliente síncrono persistente: uma única requisição, sem abrir conexão nova a cada pergunta
+    def embed_query(self, text):
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        texts = [self.query_instruction + text]
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._client.post(f"{self.base_url}/api/embed", json=self._payload(texts))
+                return self._parse(response, texts)[0]
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                if attempt == self.max_retries:
+                    raise RuntimeError(f"Falha ao gerar o embedding da consulta: {e}") from e
+                time.sleep(self.retry_backoff * 2 ** attempt)
@@ -0,0 +1,148 @@
+# Indexador contínuo: mantém o Milvus em dia com o PostgreSQL sem reiniciar o pipeline RAG
+# Instala triggers que enviam NOTIFY a cada INSERT/UPDATE/DELETE nas tabelas com coluna id,
+# agrupa as notificações em micro-lotes e reindexa só as linhas afetadas.
+#
+# Uso: python indexer.py (a coleção precisa ter sido criada antes pelo rag.py)
+
+import json
+import os
+import select
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from rag import (
+    BACKEND,
+    POSTGRES_CONFIG,
+    connect_to_milvus,
+    delete_rows_from_milvus,
+    insert_documents,
+    insert_into_milvus,
+    is_grouped,
+    iter_table_documents,
+    list_postgres_tables,
+    load_sync_state,
+    reindex_table,
+    save_sync_state,
+    split_documents,
+    sync_postgres_incremental,
+    table_columns,
+)
+
+COLLECTION_NAME = "prediza_chunks"
+INDEXER_CHANNEL = os.getenv("INDEXER_CHANNEL", "rag_changes")
+# Janela de agrupamento (s) contada a partir da primeira notificação de um lote
+INDEXER_DEBOUNCE = float(os.getenv("INDEXER_DEBOUNCE", "2"))
+INDEXER_MAX_BATCH = int(os.getenv("INDEXER_MAX_BATCH", "500"))
+
+TRIGGER_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION rag_notify_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{INDEXER_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Cria (ou recria) a trigger de notificação em cada tabela com coluna id
+def install_triggers(conn):
+    tables = []
+    with conn.cursor() as cursor:
+        cursor.execute(TRIGGER_FUNCTION_SQL)
+        for table in list_postgres_tables(conn):
+            if "id" not in table_columns(conn, table):
+                print(f"[WARN] Tabela '{table}' sem coluna id; alterações nela não serão acompanhadas.")
+                continue
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_rag_notify ON {table}")
+            cursor.execute(
+                f"CREATE TRIGGER {table}_rag_notify AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION rag_notify_change()"
+            )
+            tables.append(table)
+    return tables
+
+# Bloqueia até chegar a primeira notificação e devolve o micro-lote de (tabela, id) alterados,
+# fechado após INDEXER_DEBOUNCE segundos ou ao atingir INDEXER_MAX_BATCH linhas
+def wait_for_changes(conn, debounce=INDEXER_DEBOUNCE, max_batch=INDEXER_MAX_BATCH):
+    changes = set()
+    deadline = None
+    while True:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        readable, _, _ = select.select([conn], [], [], timeout)
+        if readable:
+            conn.poll()
+            while conn.notifies:
+                payload = json.loads(conn.notifies.pop(0).payload)
+                changes.add((payload["table"], payload["id"]))
+                if deadline is None:
+                    deadline = time.monotonic() + debounce
+        if changes and (time.monotonic() >= deadline or len(changes) >= max_batch):
+            return changes
+
+# Reindexa as linhas do lote: os chunks antigos saem sempre e as linhas que ainda existem são relidas e inseridas
+def apply_changes(changes, vectorstore, collection_name=COLLECTION_NAME):
+    by_table = {}
+    for table, row_id in changes:
+        by_table.setdefault(table, set()).add(row_id)
+
+    state = load_sync_state()
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        for table, row_ids in by_table.items():
+            if is_grouped(table):
+                # O documento do grupo inclui as demais linhas: reindexa a tabela inteira
+                inserted = reindex_table(conn, vectorstore, collection_name, table)
+                conn.rollback()
+                print(f"[INFO] '{table}': tabela agrupada reindexada, {inserted} chunks inseridos.")
+                continue
+            ids = sorted(row_ids)
+            delete_rows_from_milvus(collection_name, table, ids)
+            docs = list(iter_table_documents(conn, table, "WHERE id = ANY(%s)", (ids,)))
+            conn.rollback()
+            inserted = insert_documents(vectorstore, split_documents(docs))
+            present = {doc.metadata["row_id"] for doc in docs}
+            print(f"[INFO] '{table}': {len(present)} linhas reindexadas, {len(row_ids - present)} removidas, {inserted} chunks inseridos.")
+
+            # Mantém o estado da sincronização incremental coerente com o que foi indexado aqui
+            if state.get(table):
+                indexed_ids = (set(state[table]["ids"]) - row_ids) | present
+                state[table]["ids"] = sorted(indexed_ids)
+                state[table]["max_id"] = max(indexed_ids | {state[table]["max_id"]})
+    finally:
+        conn.close()
+    save_sync_state(state)
+
+def main():
+    connect_to_milvus()
+    if not BACKEND.has_collection(COLLECTION_NAME):
+        raise SystemExit(f"[ERRO] A coleção '{COLLECTION_NAME}' não existe; rode o rag.py primeiro.")
+    vectorstore = insert_into_milvus([], collection_name=COLLECTION_NAME, allow_append=False)
+
+    listen_conn = psycopg2.connect(**POSTGRES_CONFIG)
+    listen_conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    tables = install_triggers(listen_conn)
+    with listen_conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {INDEXER_CHANNEL}")
+    print(f"[INFO] Escutando '{INDEXER_CHANNEL}' em {len(tables)} tabelas.")
+
+    # Recupera o que mudou enquanto o indexador estava parado; o LISTEN já está ativo, então nada se perde
+    sync_postgres_incremental(vectorstore, collection_name=COLLECTION_NAME)
+
+    try:
+        while True:
+            changes = wait_for_changes(listen_conn)
+            started = time.perf_counter()
+            apply_changes(changes, vectorstore)
+            print(f"[INFO] Lote de {len(changes)} alterações aplicado em {time.perf_counter() - started:.2f}s.")
+    except KeyboardInterrupt:
+        print("[INFO] Indexador encerrado.")
+    finally:
+        listen_conn.close()
+
+if __name__ == "__main__":
+    main()
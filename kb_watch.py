@@ -0,0 +1,110 @@
+# Observa o diretório knowledge_base e avisa quais arquivos .md mudaram
+# Usa inotify via watchdog quando disponível e, sem ele, compara tamanho/mtime periodicamente.
+# Rajadas de eventos (editores que salvam várias vezes, cópias de pastas) são agrupadas:
+# o callback só roda após debounce segundos sem novos eventos, com o conjunto de caminhos afetados.
+
+import glob
+import os
+import threading
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Junta caminhos alterados e chama o callback depois de um período sem eventos;
+# execuções do callback nunca se sobrepõem
+class Debouncer:
+    def __init__(self, callback, debounce):
+        self.callback = callback
+        self.debounce = debounce
+        self.paths = set()
+        self.timer = None
+        self.lock = threading.Lock()
+        self.running = threading.Lock()
+
+    def touch(self, path):
+        with self.lock:
+            self.paths.add(os.path.relpath(path))
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce, self.fire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def fire(self):
+        with self.running:
+            with self.lock:
+                paths, self.paths = self.paths, set()
+            if not paths:
+                return
+            try:
+                self.callback(sorted(paths))
+            except Exception as e:
+                print(f"[WARN] Falha ao reindexar {len(paths)} arquivos do knowledge_base: {e}")
+
+    def cancel(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+
+class MarkdownEventHandler(FileSystemEventHandler):
+    def __init__(self, debouncer):
+        super().__init__()
+        self.debouncer = debouncer
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path and path.endswith(".md"):
+                self.debouncer.touch(path)
+
+def snapshot_markdown(root):
+    snapshot = {}
+    for path in glob.glob(os.path.join(root, "**", "*.md"), recursive=True):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def poll_markdown(root, debouncer, interval, stop_event):
+    previous = snapshot_markdown(root)
+    while not stop_event.wait(interval):
+        current = snapshot_markdown(root)
+        for path in previous.keys() | current.keys():
+            if previous.get(path) != current.get(path):
+                debouncer.touch(path)
+        previous = current
+
+# Começa a observar root em segundo plano e devolve uma função que encerra a observação
+def start_watch(root, callback, debounce=2.0, poll_interval=5.0, use_polling=False):
+    debouncer = Debouncer(callback, debounce)
+
+    if Observer is not None and not use_polling:
+        observer = Observer()
+        observer.schedule(MarkdownEventHandler(debouncer), root, recursive=True)
+        observer.daemon = True
+        observer.start()
+        print(f"[INFO] Observando '{root}' com watchdog.")
+
+        def stop():
+            observer.stop()
+            observer.join()
+            debouncer.cancel()
+        return stop
+
+    stop_event = threading.Event()
+    thread = threading.Thread(target=poll_markdown, args=(root, debouncer, poll_interval, stop_event), daemon=True)
+    thread.start()
+    print(f"[INFO] Observando '{root}' por polling a cada {poll_interval}s.")
+
+    def stop():
+        stop_event.set()
+        thread.join()
+        debouncer.cancel()
+    return stop
@@ -0,0 +1,328 @@
+# Vector store embutido, sem Milvus: para instalações pequenas, máquinas de campo e CI
+# Cada coleção é um diretório com:
+#   collection.json  dimensão, métrica e campos de metadados
+#   vectors.npy      vetores float32 mapeados em memória (linha = pk), crescendo por duplicação
+#   chunks.sqlite    texto e metadados de cada pk; uma linha apagada sai daqui e do filtro de vivos
+#   centroids.npy / assignments.npy  quantizador IVF opcional (k-means), treinado quando há dados suficientes
+# A busca é exata e vetorizada sobre o mapa de memória (ou só nas listas IVF mais próximas). Filtros e
+# remoções aceitam o subconjunto das expressões do Milvus que o pipeline usa: campo == valor,
+# campo in [...] e comparações (>=, <=, >, <), unidos por "and".
+
+import json
+import operator
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from collections import namedtuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+INITIAL_CAPACITY = 1024
+# Linhas por centróide para treinar o IVF (regra usual do k-means do Faiss)
+IVF_MIN_ROWS_PER_LIST = 39
+IVF_TRAIN_SAMPLE = 50_000
+ASSIGN_BATCH = 65_536
+
+# Mesmo formato de collection.schema.fields do pymilvus, usado por has_content_hash_field
+LocalField = namedtuple("LocalField", "name")
+LocalSchema = namedtuple("LocalSchema", "fields")
+
+EXPR_CLAUSE = re.compile(r'\s*(\w+)\s*(==|>=|<=|>|<|in\b)\s*("(?:[^"\\]|\\.)*"|\[[^\]]*\]|-?\d+)\s*(?:and\b|$)')
+COMPARISONS = {">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+
+# [(campo, operador, valor)] de uma expressão como 'doc_type == "ndvi_insights" and row_id in [1, 2]';
+# == vira in com um conjunto de um valor
+def parse_expr(expr):
+    clauses = []
+    position = 0
+    while position < len(expr.rstrip()):
+        match = EXPR_CLAUSE.match(expr, position)
+        if match is None:
+            raise ValueError(f"Expressão não suportada pelo vector store local: {expr}")
+        field, comparison, value = match.groups()
+        value = json.loads(value)
+        if comparison == "in":
+            clauses.append((field, "in", set(value)))
+        elif comparison == "==":
+            clauses.append((field, "in", {value}))
+        else:
+            clauses.append((field, comparison, value))
+        position = match.end()
+    return clauses
+
+def clause_matches(value, comparison, operand):
+    if comparison == "in":
+        return value in operand
+    return value is not None and COMPARISONS[comparison](value, operand)
+
+def open_memmap(path, dtype, shape):
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+# Copia o mapa de memória para um arquivo maior e troca o arquivo de forma atômica
+def grow_memmap(path, array, capacity, fill=0):
+    tmp_path = path + ".tmp"
+    grown = open_memmap(tmp_path, array.dtype, (capacity, *array.shape[1:]))
+    grown[:len(array)] = array
+    grown[len(array):] = fill
+    grown.flush()
+    del grown
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r+")
+
+# Índice do centróide mais próximo (L2) de cada vetor
+def nearest_centroids(vectors, centroids):
+    distances = (centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T
+    return distances.argmin(axis=1).astype(np.int32)
+
+class LocalCollection:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "collection.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        self.dim = config["dim"]
+        self.metric = config["metric"]
+        self.schema = LocalSchema([LocalField(name) for name in ["pk", "text", "vector", *config["fields"]]])
+        self.lock = threading.RLock()
+
+        self.conn = sqlite3.connect(os.path.join(path, "chunks.sqlite"), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (pk INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        self.metadata = {pk: json.loads(metadata) for pk, metadata in self.conn.execute("SELECT pk, metadata FROM chunks")}
+        self.size = max(self.metadata, default=-1) + 1
+
+        self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r+")
+        self.alive = np.zeros(len(self.vectors), dtype=bool)
+        self.alive[list(self.metadata)] = True
+        self.norms = np.zeros(len(self.vectors), dtype=np.float32)
+        for start in range(0, self.size, ASSIGN_BATCH):
+            block = self.vectors[start:min(start + ASSIGN_BATCH, self.size)]
+            self.norms[start:start + len(block)] = (block ** 2).sum(axis=1)
+
+        self.centroids = None
+        self.assignments = None
+        if os.path.exists(self._file("centroids.npy")):
+            self.centroids = np.load(self._file("centroids.npy"))
+            self.assignments = np.load(self._file("assignments.npy"), mmap_mode="r+")
+        self.lists = None
+        self.masks = {}
+
+    @classmethod
+    def create(cls, path, dim, fields, metric="L2"):
+        os.makedirs(path, exist_ok=True)
+        open_memmap(os.path.join(path, "vectors.npy"), np.float32, (INITIAL_CAPACITY, dim)).flush()
+        with open(os.path.join(path, "collection.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "metric": metric, "fields": list(fields)}, f)
+        return cls(path)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @property
+    def num_entities(self):
+        return int(self.alive[:self.size].sum())
+
+    # Compatibilidade com a interface de Collection usada pelo pipeline
+    def flush(self):
+        self.vectors.flush()
+
+    def load(self):
+        pass
+
+    def release(self):
+        pass
+
+    def _grow(self, capacity):
+        self.vectors = grow_memmap(self._file("vectors.npy"), self.vectors, capacity)
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        self.norms = np.concatenate([self.norms, np.zeros(capacity - len(self.norms), dtype=np.float32)])
+        if self.assignments is not None:
+            self.assignments = grow_memmap(self._file("assignments.npy"), self.assignments, capacity, fill=-1)
+
+    def insert(self, texts, vectors, metadatas):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            start, end = self.size, self.size + len(texts)
+            if end > len(self.vectors):
+                self._grow(max(end, 2 * len(self.vectors)))
+            self.vectors[start:end] = vectors
+            self.vectors.flush()
+            if self.assignments is not None:
+                self.assignments[start:end] = nearest_centroids(vectors, self.centroids)
+                self.assignments.flush()
+            self.conn.executemany(
+                "INSERT INTO chunks (pk, text, metadata) VALUES (?, ?, ?)",
+                [(start + i, text, json.dumps(metadata, ensure_ascii=False)) for i, (text, metadata) in enumerate(zip(texts, metadatas))],
+            )
+            self.conn.commit()
+            for i, metadata in enumerate(metadatas):
+                self.metadata[start + i] = dict(metadata)
+            self.alive[start:end] = True
+            self.norms[start:end] = (vectors ** 2).sum(axis=1)
+            self.size = end
+            self.lists = None
+            self.masks.clear()
+        return list(range(start, end))
+
+    def _match(self, expr):
+        clauses = parse_expr(expr)
+        return [pk for pk, metadata in self.metadata.items() if all(clause_matches(metadata.get(field), comparison, value) for field, comparison, value in clauses)]
+
+    def delete(self, expr):
+        with self.lock:
+            pks = self._match(expr)
+            if pks:
+                self.conn.executemany("DELETE FROM chunks WHERE pk = ?", [(pk,) for pk in pks])
+                self.conn.commit()
+                for pk in pks:
+                    del self.metadata[pk]
+                self.alive[pks] = False
+                self.masks.clear()
+        return len(pks)
+
+    def query(self, expr, output_fields=None):
+        with self.lock:
+            pks = self._match(expr)
+            rows = [{"pk": pk, **self.metadata[pk]} for pk in pks]
+        if output_fields:
+            rows = [{field: row.get(field) for field in output_fields} for row in rows]
+        return rows
+
+    # Máscara de linhas vivas que casam com o filtro, guardada até a próxima escrita
+    def _mask(self, expr):
+        if not expr:
+            return self.alive[:self.size]
+        mask = self.masks.get(expr)
+        if mask is None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[self._match(expr)] = True
+            self.masks[expr] = mask
+        return mask
+
+    # Custo a minimizar de cada linha (distância L2 ao quadrado ou similaridade negativa) e o score exibido
+    def _costs(self, rows, vectors, query):
+        products = vectors @ query
+        if self.metric == "L2":
+            costs = self.norms[rows] - 2 * products + query @ query
+            return costs, costs
+        if self.metric == "COSINE":
+            norms = np.sqrt(self.norms[rows]) * np.linalg.norm(query)
+            products = products / np.where(norms > 0, norms, 1.0)
+        return -products, products
+
+    # Linhas de cada lista do IVF, recalculadas depois de cada inserção
+    def _ivf_lists(self):
+        if self.lists is None:
+            assignments = np.asarray(self.assignments[:self.size])
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+        return self.lists
+
+    def search(self, vector, k=4, expr=None, nprobe=8):
+        query = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            mask = self._mask(expr)
+            if self.centroids is not None:
+                lists = self._ivf_lists()
+                probed = np.argsort(nearest_distances(query, self.centroids))[:nprobe]
+                rows = np.sort(np.concatenate([lists[c] for c in probed]))
+                rows = rows[mask[rows]]
+                vectors = self.vectors[rows]
+            else:
+                rows = np.flatnonzero(mask)
+                vectors = self.vectors[:self.size] if len(rows) == self.size else self.vectors[rows]
+            if not len(rows):
+                return []
+            costs, scores = self._costs(rows, vectors, query)
+            k = min(k, len(rows))
+            best = np.argpartition(costs, k - 1)[:k]
+            best = best[np.argsort(costs[best], kind="stable")]
+            pks = [int(rows[i]) for i in best]
+            placeholders = ",".join("?" * len(pks))
+            texts = dict(self.conn.execute(f"SELECT pk, text FROM chunks WHERE pk IN ({placeholders})", pks))
+            return [
+                (Document(page_content=texts[pk], metadata=dict(self.metadata[pk])), float(scores[i]))
+                for pk, i in zip(pks, best)
+            ]
+
+    # k-means (L2) sobre uma amostra das linhas vivas; depois atribui todas as linhas à lista mais próxima
+    def train_ivf(self, nlist, iterations=10, seed=0):
+        with self.lock:
+            rng = np.random.default_rng(seed)
+            live = np.flatnonzero(self.alive[:self.size])
+            sample = self.vectors[np.sort(rng.choice(live, min(len(live), IVF_TRAIN_SAMPLE), replace=False))]
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = nearest_centroids(sample, centroids)
+                for c in range(nlist):
+                    members = sample[assignment == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+            np.save(self._file("centroids.npy"), centroids)
+            assignments = open_memmap(self._file("assignments.npy"), np.int32, (len(self.vectors),))
+            assignments[:] = -1
+            for start in range(0, self.size, ASSIGN_BATCH):
+                end = min(start + ASSIGN_BATCH, self.size)
+                assignments[start:end] = nearest_centroids(self.vectors[start:end], centroids)
+            assignments.flush()
+            self.centroids, self.assignments = centroids, assignments
+            self.lists = None
+        print(f"[INFO] IVF da coleção local '{self.name}' treinado com {nlist} listas sobre {len(sample)} vetores.")
+
+    def maybe_train_ivf(self, nlist):
+        if nlist and self.centroids is None and self.num_entities >= nlist * IVF_MIN_ROWS_PER_LIST:
+            self.train_ivf(nlist)
+
+def nearest_distances(query, centroids):
+    return (centroids ** 2).sum(axis=1) - 2 * centroids @ query
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, embedding_function, collection, nlist=0, nprobe=8):
+        self.embedding_func = embedding_function
+        self.col = collection
+        self.collection_name = collection.name
+        self.nlist = nlist
+        self.nprobe = nprobe
+
+    @property
+    def embeddings(self):
+        return self.embedding_func
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding_func.embed_documents(texts)
+        pks = self.col.insert(texts, vectors, metadatas or [{} for _ in texts])
+        self.col.maybe_train_ivf(self.nlist)
+        return pks
+
+    # param segue o formato do Milvus: {"params": {"nprobe": 16}}
+    def similarity_search_with_score_by_vector(self, embedding, k=4, param=None, expr=None, **kwargs):
+        nprobe = ((param or {}).get("params") or {}).get("nprobe", self.nprobe)
+        return self.col.search(embedding, k, expr=expr, nprobe=nprobe)
+
+    def similarity_search_by_vector(self, embedding, k=4, param=None, expr=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, param, expr)]
+
+    def similarity_search_with_score(self, query, k=4, param=None, expr=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding_func.embed_query(query), k, param, expr)
+
+    def similarity_search(self, query, k=4, param=None, expr=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, param, expr)]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, path=".rag_state/vectors/local", metric="L2", **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = embedding.embed_documents(texts)
+        collection = LocalCollection.create(path, len(vectors[0]), sorted(metadatas[0]), metric)
+        collection.insert(texts, vectors, metadatas)
+        return cls(embedding, collection)
+
+def drop_local_collection(path):
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,86 @@
+# Schema explícito da coleção de chunks e parâmetros do índice vetorial
+# Substitui o schema inferido pelo Milvus.from_documents (metadados do primeiro documento, todo texto
+# como VARCHAR de 65535): os campos escalares têm tipo e tamanho definidos aqui e o índice vetorial
+# é escolhido por configuração. Os nomes pk/text/vector são os que o wrapper Milvus do LangChain espera.
+# Com partition key, o doc_type define a partição de cada chunk e buscas filtradas por doc_type só
+# percorrem as partições correspondentes. Os campos escalares do knowledge_base1 (date, area, name,
+# feature) têm índice escalar e são usados como pré-filtro da busca vetorial.
+
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema
+
+# Tipos de índice suportados e os parâmetros de construção usados quando nenhum é informado
+DEFAULT_INDEX_BUILD_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_SQ8": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 16, "nbits": 8},
+    "HNSW": {"M": 8, "efConstruction": 64},
+}
+
+# Campos escalares filtráveis e o valor dos chunks em que não se aplicam (markdown e outras tabelas):
+# o Milvus exige os mesmos campos em todas as linhas. date é AAAAMMDD em INT64 (não há tipo data no 2.3)
+SCALAR_FIELD_DEFAULTS = {"date": 0, "area": "", "name": "", "feature": ""}
+
+def scalar_fields():
+    return [
+        FieldSchema(name, DataType.INT64) if isinstance(default, int) else FieldSchema(name, DataType.VARCHAR, max_length=256)
+        for name, default in SCALAR_FIELD_DEFAULTS.items()
+    ]
+
+# Campos de metadados presentes em todos os chunks (ver chunk_metadata no rag.py)
+def chunk_metadata_fields(with_content_hash=True, partition_key=False):
+    fields = [
+        FieldSchema("source", DataType.VARCHAR, max_length=1024),
+        FieldSchema("doc_type", DataType.VARCHAR, max_length=256, is_partition_key=partition_key),
+        FieldSchema("row_id", DataType.INT64),
+    ]
+    if with_content_hash:
+        fields.append(FieldSchema("content_hash", DataType.VARCHAR, max_length=64))
+    return fields + scalar_fields()
+
+def build_chunk_schema(dim, with_content_hash=True, partition_key=False, description="Chunks do pipeline RAG da Prediza"):
+    fields = [
+        FieldSchema("pk", DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema("text", DataType.VARCHAR, max_length=65_535),
+        FieldSchema("vector", DataType.FLOAT_VECTOR, dim=dim),
+        *chunk_metadata_fields(with_content_hash, partition_key),
+    ]
+    return CollectionSchema(fields, description=description)
+
+def index_params(index_type="HNSW", metric_type="L2", params=None):
+    if index_type not in DEFAULT_INDEX_BUILD_PARAMS:
+        raise ValueError(f"Índice vetorial inválido: '{index_type}' (use {', '.join(DEFAULT_INDEX_BUILD_PARAMS)}).")
+    return {
+        "index_type": index_type,
+        "metric_type": metric_type,
+        "params": params if params is not None else DEFAULT_INDEX_BUILD_PARAMS[index_type],
+    }
+
+# Parâmetros de busca do índice: nprobe para os IVF_*, ef para o HNSW (ef precisa ser >= k)
+def search_params(index_type="HNSW", metric_type="L2", nprobe=16, ef=64):
+    if index_type.startswith("IVF_"):
+        params = {"nprobe": nprobe}
+    elif index_type == "HNSW":
+        params = {"ef": ef}
+    else:
+        params = {}
+    return {"metric_type": metric_type, "params": params}
+
+# Cria a coleção vazia com o schema explícito e o índice vetorial;
+# num_partitions > 0 usa doc_type como partition key, com esse número de partições.
+# Consistência Session (a do Milvus.from_documents): uma consulta logo após uma remoção já não vê o removido
+def create_chunk_collection(name, dim, index, with_content_hash=True, num_partitions=0):
+    if num_partitions > 0:
+        collection = Collection(
+            name, build_chunk_schema(dim, with_content_hash, partition_key=True), num_partitions=num_partitions, consistency_level="Session"
+        )
+    else:
+        collection = Collection(name, build_chunk_schema(dim, with_content_hash), consistency_level="Session")
+    collection.create_index("vector", index)
+    # Índices escalares do Milvus 2.3: STL_SORT para números (intervalos de data), Trie para texto
+    for field in scalar_fields():
+        index_type = "STL_SORT" if field.dtype == DataType.INT64 else "Trie"
+        collection.create_index(field.name, {"index_type": index_type}, index_name=f"{field.name}_index")
+    partitions = f", {num_partitions} partições por doc_type" if num_partitions > 0 else ""
+    print(f"[INFO] Coleção '{name}' criada com vetores de {dim} dimensões e índice {index['index_type']} ({index['metric_type']}){partitions}.")
+    return collection
@@ -0,0 +1,107 @@
+# Reformulação da pergunta só quando ela depende do histórico
+# O ConversationalRetrievalChain chama o question_generator (uma geração inteira do LLM) antes de cada
+# busca com histórico. CondenseQuestionChain entra no lugar do LLMChain e devolve a pergunta como veio
+# quando ela se sustenta sozinha: sem palavras de continuação ("isso", "ele", "e o NDWI?") e com
+# min_words palavras ou mais; perguntas curtas sem essas palavras passam se o embedding estiver longe
+# do da pergunta anterior (mudança de assunto). O primeiro turno já não chama o LLM; record_first_turn
+# só conta esses turnos nas estatísticas.
+
+import re
+import threading
+import unicodedata
+from typing import Any, Optional
+
+import numpy as np
+from langchain.chains import LLMChain
+from pydantic import PrivateAttr
+
+# Pronomes, demonstrativos e expressões que retomam o assunto anterior
+FOLLOW_UP_WORDS = frozenset(
+    "ele ela eles elas dele dela deles delas nele nela neles nelas isso isto disso disto nisso nisto "
+    "esse essa esses essas desse dessa desses dessas nesse nessa este estes deste desta "
+    "aquele aquela aqueles aquelas daquele daquela aquilo mesmo mesma tambem anterior acima outro outra "
+    "lo la los las lhe lhes".split()
+)
+# Palavras que, sem acento, se confundem com verbos ("está", "estás", "É possível..."): comparadas
+# antes de tirar os acentos
+ACCENTED_FOLLOW_UP_WORDS = frozenset(("esta", "estas"))
+ACCENTED_FOLLOW_UP_PREFIXES = ("e ",)
+FOLLOW_UP_PREFIXES = ("mas ", "entao ")
+LAST_QUESTION = re.compile(r"Human: (.*?)\nAssistant: ", re.DOTALL)
+
+def fold_words(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return text, re.findall(r"\w+", text)
+
+def cosine(a, b):
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    norms = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norms) if norms else 0.0
+
+# True se a pergunta pode ir para a busca sem o histórico
+def is_self_contained(question, previous_question=None, embeddings=None, min_words=4, threshold=0.5):
+    question = question.strip()
+    text, words = fold_words(question)
+    accented = question.casefold()
+    if accented.startswith(ACCENTED_FOLLOW_UP_PREFIXES) or ACCENTED_FOLLOW_UP_WORDS.intersection(re.findall(r"\w+", accented)):
+        return False
+    if text.startswith(FOLLOW_UP_PREFIXES) or FOLLOW_UP_WORDS.intersection(words):
+        return False
+    if len(words) >= min_words:
+        return True
+    if embeddings is not None and previous_question:
+        return cosine(embeddings.embed_query(question), embeddings.embed_query(previous_question)) < threshold
+    return False
+
+class CondenseQuestionChain(LLMChain):
+    # mode "auto" pula a reformulação de perguntas independentes; "always" reformula sempre
+    mode: str = "auto"
+    embeddings: Optional[Any] = None
+    min_words: int = 4
+    similarity_threshold: float = 0.5
+    first_turns: int = 0
+    self_contained: int = 0
+    condensed: int = 0
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_first_turn(self):
+        self._count("first_turns")
+
+    def _skip(self, inputs):
+        if self.mode != "auto":
+            return False
+        previous = LAST_QUESTION.findall(inputs.get("chat_history", ""))
+        return is_self_contained(
+            inputs["question"], previous[-1] if previous else None, self.embeddings, self.min_words, self.similarity_threshold
+        )
+
+    def _call(self, inputs, run_manager=None):
+        if self._skip(inputs):
+            self._count("self_contained")
+            return {self.output_key: inputs["question"]}
+        self._count("condensed")
+        return super()._call(inputs, run_manager)
+
+    async def _acall(self, inputs, run_manager=None):
+        if self._skip(inputs):
+            self._count("self_contained")
+            return {self.output_key: inputs["question"]}
+        self._count("condensed")
+        return await super()._acall(inputs, run_manager)
+
+    def stats(self):
+        with self._lock:
+            skipped = self.first_turns + self.self_contained
+            total = skipped + self.condensed
+            return {
+                "turns": total,
+                "skipped": skipped,
+                "first_turns": self.first_turns,
+                "self_contained": self.self_contained,
+                "skip_rate": skipped / total if total else 0.0,
+            }
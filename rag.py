@@ -1,12 +1,25 @@
 import os
+import codecs
+import csv
+import datetime
 import glob
+import hashlib
+import itertools
+import json
+import math
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 from langchain.docstore.document import Document
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import Milvus
-from pymilvus import connections, utility
+from pymilvus import utility
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain,LLMChain
 from langchain_ollama import ChatOllama
@@ -17,6 +30,21 @@ from langchain_community.chat_models import ChatOllama
 
 import gradio as gr
 
+from answer_cache import SemanticAnswerCache
+from bulk_load import MilvusBulkLoader
+from collection_versions import current_version, gc_versions, new_version_name, switch_alias, verify_version
+from embedding_cache import CachedEmbeddings, QueryEmbeddingCache
+from embedding_client import BatchOllamaEmbeddings
+from kb_watch import start_watch
+from question_condenser import CondenseQuestionChain, is_self_contained
+from milvus_schema import SCALAR_FIELD_DEFAULTS, index_params, search_params
+from retrievers import DocTypeRoutingRetriever, HybridRetriever, ScalarFilterRetriever, date_to_int, route_doc_types, route_scalar_filters
+from sparse_index import BM25Index
+from splitter import StreamingTextSplitter, iter_split_documents_parallel
+from vector_backends import LocalBackend, MilvusBackend
+from vector_compression import RescoringRetriever, TruncatedEmbeddings
+from vectorstore_manager import VectorStoreManager
+
 # Carregar variáveis de ambiente do .env
 load_dotenv()
 
@@ -28,95 +56,1104 @@ POSTGRES_CONFIG = {
     "password": os.getenv("POSTGRES_PASSWORD", "admin")
 }
 
-# Conecta o PostgreSQL e buscar dados de todas as tabelas
-def load_postgres_documents():
+# Parâmetros de ingestão em streaming
+INGEST_STREAMING = os.getenv("INGEST_STREAMING", "false").lower() == "true"
+PG_ITERSIZE = int(os.getenv("PG_ITERSIZE", "2000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+
+# Agrupa um iterável em listas de no máximo batch_size itens
+def iter_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+# Colunas de controle que não entram no texto indexado
+CONTROL_COLUMNS = {"updated_at"}
+
+# Renderização das linhas por tabela:
+#   columns  - colunas incluídas no texto, na ordem (padrão: todas menos as de exclude)
+#   exclude  - colunas omitidas quando columns não é informado
+#   template - formato do texto com {coluna}; sem template cada coluna vira uma linha "coluna: valor"
+#   group    - "row" (um documento por linha), "table" (um documento por tabela) ou N (um documento a cada N linhas)
+DEFAULT_RENDERING = {"exclude": ["id"], "group": "row"}
+TABLE_RENDERING = {
+    "knowledge_base1": {
+        "template": (
+            "Talhão {name} ({area}) em {date} - {feature} ({data_type})\n"
+            "Insights: {insights}\n"
+            "Recomendação: {recommendation}\n"
+            "Responsável: {responsible}"
+        ),
+    },
+    "ndvi_interpretation": {"group": "table"},
+    "gndvi_interpretation": {"group": "table"},
+    "gndvi_insights": {"group": "table"},
+    "ndwi_interpretation": {"group": "table"},
+    "ndwi_insights": {"group": "table"},
+    "osavi_interpretation": {"group": "table"},
+    "osavi_fenologico": {"group": "table"},
+    "osavi_insights": {"group": "table"},
+    "recl_interpretation": {"group": "table"},
+    "recl_insights": {"group": "table"},
+    "savi_interpretation": {"group": "table"},
+    "savi_insights": {"group": "table"},
+}
+
+def table_rendering(table):
+    return {**DEFAULT_RENDERING, **TABLE_RENDERING.get(table, {})}
+
+# Tabelas agrupadas não têm um documento por linha e são sempre reindexadas por inteiro
+def is_grouped(table):
+    return table_rendering(table)["group"] != "row"
+
+def render_row(table, values):
+    rendering = table_rendering(table)
+    if rendering.get("template"):
+        return rendering["template"].format_map({col: "" if val is None else val for col, val in values.items()})
+    columns = rendering.get("columns") or [col for col in values if col not in rendering["exclude"]]
+    return "\n".join(f"{col}: {values[col]}" for col in columns if col in values and col not in CONTROL_COLUMNS)
+
+# Colunas de cada tabela copiadas para os campos escalares filtráveis da coleção (milvus_schema.py)
+TABLE_SCALAR_FIELDS = {"knowledge_base1": ["date", "area", "name", "feature"]}
+
+# Metadados de um chunk: todos têm os mesmos campos, com os valores padrão dos escalares que não se aplicam
+def chunk_metadata(source, doc_type, row_id=0, values=None):
+    metadata = {"source": source, "doc_type": doc_type, "row_id": row_id, **SCALAR_FIELD_DEFAULTS}
+    for field in TABLE_SCALAR_FIELDS.get(doc_type, []) if values else []:
+        if values.get(field) is not None:
+            metadata[field] = date_to_int(values[field]) if field == "date" else str(values[field])
+    return metadata
+
+# Converte uma linha de tabela em Document; row_id guarda o id da linha para sincronização
+def row_to_document(table, colnames, row):
+    values = dict(zip(colnames, row))
+    row_id = int(values["id"]) if values.get("id") is not None else 0
+    return Document(page_content=render_row(table, values), metadata=chunk_metadata("postgresql", table, row_id, values))
+
+# Junta os documentos de linha conforme o group da tabela; documentos agrupados usam row_id 0
+def group_documents(table, docs):
+    group = table_rendering(table)["group"]
+    if group == "row":
+        yield from docs
+        return
+    size = None if group == "table" else int(group)
+    batches = [list(docs)] if size is None else iter_batches(docs, size)
+    for batch in batches:
+        if batch:
+            content = "\n\n".join(doc.page_content for doc in batch)
+            yield Document(page_content=content, metadata=chunk_metadata("postgresql", table))
+
+def list_postgres_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public'")
+        return [row[0] for row in cursor.fetchall()]
+
+# Percorre todas as tabelas com cursores nomeados (server-side), gerando um Document por linha
+# sem carregar a tabela inteira na memória; itersize controla quantas linhas vêm por ida ao banco
+def iter_postgres_documents(itersize=PG_ITERSIZE):
     conn = psycopg2.connect(**POSTGRES_CONFIG)
-    cursor = conn.cursor()
-    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public'")
-    tables = [row[0] for row in cursor.fetchall()]
-    
-    documents_pg = []
+    try:
+        for table in list_postgres_tables(conn):
+            yield from iter_table_documents(conn, table, itersize=itersize)
+    finally:
+        conn.close()
+
+# Extração paralela: PG_WORKERS > 1 distribui tabelas e faixas de id entre threads
+PG_WORKERS = int(os.getenv("PG_WORKERS", "1"))
+PG_SLICE_ROWS = int(os.getenv("PG_SLICE_ROWS", "50000"))
+
+def table_columns(conn, table):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        return [desc[0] for desc in cursor.description]
+
+# Backend de exportação: "cursor" (cursor nomeado) ou "copy" (COPY ... TO STDOUT em CSV)
+PG_EXPORT = os.getenv("PG_EXPORT", "cursor")
+COPY_QUEUE_SIZE = 64
+
+# Arquivo mínimo para o copy_expert: cada bloco recebido vai para a fila do consumidor
+class QueueWriter:
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def write(self, data):
+        self.blocks.put(data)
+        return len(data)
+
+# Executa COPY (query) TO STDOUT numa thread e devolve as linhas já parseadas à medida que chegam;
+# a fila limitada faz o banco esperar quando o consumidor está mais lento
+def iter_copy_rows(conn, query):
+    blocks = queue.Queue(maxsize=COPY_QUEUE_SIZE)
+    errors = []
+
+    def produce():
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')", QueueWriter(blocks))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            blocks.put(None)
+
+    def lines():
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        pending = ""
+        while True:
+            data = blocks.get()
+            if data is None:
+                break
+            pending += decoder.decode(data) if isinstance(data, bytes) else data
+            *complete, pending = pending.split("\n")
+            for line in complete:
+                yield line + "\n"
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    finished = False
+    try:
+        reader = csv.reader(lines())
+        header = next(reader, None)
+        for record in reader:
+            yield header, [None if value == "\\N" else value for value in record]
+        finished = True
+    finally:
+        if not finished and producer.is_alive():
+            # Consumidor desistiu no meio: cancela o COPY e esvazia a fila para liberar a thread
+            conn.cancel()
+            while blocks.get() is not None:
+                pass
+        producer.join()
+    if errors:
+        raise errors[0]
+
+# O COPY entrega o texto do Postgres ({a,b}, t/f, JSON); cada valor passa pelo typecaster que o cursor
+# usaria para o tipo da coluna, para os dois backends renderizarem os mesmos documentos (e content_hash)
+def iter_row_documents_copy(conn, table, where="", params=()):
+    with conn.cursor() as cursor:
+        query = cursor.mogrify(f"SELECT * FROM {table} {where}", params).decode("utf-8")
+        cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        casters = [psycopg2.extensions.string_types.get(desc.type_code) for desc in cursor.description]
+        for colnames, row in iter_copy_rows(conn, query):
+            values = [value if value is None or caster is None else caster(value, cursor) for caster, value in zip(casters, row)]
+            yield row_to_document(table, colnames, values)
+
+# Lê com cursor nomeado as linhas que casam com o filtro, um Document por linha
+def iter_row_documents(conn, table, where="", params=(), itersize=PG_ITERSIZE, export=None):
+    if (export or PG_EXPORT) == "copy":
+        yield from iter_row_documents_copy(conn, table, where, params)
+        return
+    with conn.cursor(name=f"rag_{table}") as cursor:
+        cursor.itersize = itersize
+        cursor.execute(f"SELECT * FROM {table} {where}", params)
+        colnames = None
+        for row in cursor:
+            if colnames is None:
+                colnames = [desc[0] for desc in cursor.description]
+            yield row_to_document(table, colnames, row)
+
+# Documentos de uma tabela já com a renderização e o agrupamento configurados
+def iter_table_documents(conn, table, where="", params=(), itersize=PG_ITERSIZE, export=None):
+    yield from group_documents(table, iter_row_documents(conn, table, where, params, itersize, export))
+
+# Divide as tabelas grandes em faixas de id com cerca de slice_rows linhas cada
+def plan_extraction(conn, tables, slice_rows=PG_SLICE_ROWS):
+    tasks = []
     for table in tables:
-        cursor.execute(f"SELECT * FROM {table}")
-        rows = cursor.fetchall()
-        colnames = [desc[0] for desc in cursor.description]
-        for row in rows:
-            content = "\n".join(f"{col}: {val}" for col, val in zip(colnames, row))
-            documents_pg.append(Document(page_content=content, metadata={"source": "postgresql", "doc_type": table}))
-    
-    cursor.close()
-    conn.close()
-    return documents_pg
+        if "id" not in table_columns(conn, table):
+            tasks.append((table, "", ()))
+            continue
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT min(id), max(id), count(*) FROM {table}")
+            min_id, max_id, count = cursor.fetchone()
+        if count <= slice_rows:
+            tasks.append((table, "", ()))
+            continue
+        step = math.ceil((max_id - min_id + 1) / math.ceil(count / slice_rows))
+        for start in range(min_id, max_id + 1, step):
+            tasks.append((table, "WHERE id >= %s AND id < %s ORDER BY id", (start, start + step)))
+    return tasks
 
-# Carregar arquivos .md de cada pasta
-def load_markdown_documents():
+def extract_slice(pool, table, where, params):
+    conn = pool.getconn()
+    try:
+        started = time.perf_counter()
+        # As linhas são contadas antes do agrupamento, que junta várias num documento só
+        row_docs = list(iter_row_documents(conn, table, where, params))
+        docs = list(group_documents(table, row_docs))
+        conn.rollback()
+        return table, len(row_docs), docs, started, time.perf_counter()
+    finally:
+        pool.putconn(conn)
+
+# Extrai as tabelas em paralelo com um pool de conexões compartilhado; os documentos saem na
+# ordem do plano e no máximo 2 * workers fatias ficam em memória ao mesmo tempo
+def iter_postgres_documents_parallel(workers=PG_WORKERS, slice_rows=PG_SLICE_ROWS):
+    pool = ThreadedConnectionPool(1, workers, **POSTGRES_CONFIG)
+    stats = {}
+    try:
+        conn = pool.getconn()
+        try:
+            tasks = plan_extraction(conn, list_postgres_tables(conn), slice_rows)
+            conn.rollback()
+        finally:
+            pool.putconn(conn)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            remaining = iter(tasks)
+            pending = deque(executor.submit(extract_slice, pool, *task) for task in itertools.islice(remaining, workers * 2))
+            while pending:
+                table, row_count, docs, started, finished = pending.popleft().result()
+                next_task = next(remaining, None)
+                if next_task is not None:
+                    pending.append(executor.submit(extract_slice, pool, *next_task))
+                rows, first, last = stats.get(table, (0, started, finished))
+                stats[table] = (rows + row_count, min(first, started), max(last, finished))
+                yield from docs
+    finally:
+        pool.closeall()
+
+    for table, (rows, first, last) in stats.items():
+        elapsed = max(last - first, 1e-6)
+        print(f"[INFO] '{table}': {rows} linhas em {elapsed:.2f}s ({rows / elapsed:.0f} linhas/s)")
+
+def select_postgres_iterator():
+    return iter_postgres_documents_parallel() if PG_WORKERS > 1 else iter_postgres_documents()
+
+# Conecta o PostgreSQL e buscar dados de todas as tabelas
+def load_postgres_documents():
+    return list(select_postgres_iterator())
+
+# Carregar arquivos .md de cada pasta, um arquivo por vez
+def iter_markdown_documents():
     folders = glob.glob("knowledge_base/*")
     text_loader_kwargs = {'encoding': 'utf-8'}
-    documents = []
-
-    def add_metadata(doc, doc_type):
-        doc.metadata["doc_type"] = doc_type
-        return doc
 
     for folder in folders:
         doc_type = os.path.basename(folder)
         loader = DirectoryLoader(folder, glob="**/*.md", loader_cls=TextLoader, loader_kwargs=text_loader_kwargs)
-        folder_docs = loader.load()
-        documents.extend([add_metadata(doc, doc_type) for doc in folder_docs])
-    
-    return documents
+        for doc in loader.lazy_load():
+            doc.metadata.update(chunk_metadata(doc.metadata["source"], doc_type))
+            yield doc
+
+# Carregar arquivos .md de cada pasta
+def load_markdown_documents():
+    return list(iter_markdown_documents())
+
+# Todos os doc_type possíveis: tabelas do PostgreSQL e pastas do knowledge_base
+def list_doc_types():
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        tables = list_postgres_tables(conn)
+    finally:
+        conn.close()
+    folders = [os.path.basename(folder) for folder in glob.glob("knowledge_base/*") if os.path.isdir(folder)]
+    return sorted(set(tables) | set(folders))
+
+# Áreas e talhões do knowledge_base1, para reconhecer os citados nas perguntas
+def list_scalar_values():
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        if "knowledge_base1" not in list_postgres_tables(conn):
+            return {}
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT area, name FROM knowledge_base1")
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return {"area": sorted({area for area, _ in rows if area}), "name": sorted({name for _, name in rows if name})}
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+# "ollama" usa o OllamaEmbeddings (uma requisição por texto); "batch" usa o BatchOllamaEmbeddings.
+# Os vetores dos dois clientes não são intercambiáveis: trocar o cliente exige recriar a coleção
+EMBEDDING_CLIENT = os.getenv("EMBEDDING_CLIENT", "ollama")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+# Cache persistente de embeddings: reconstruções da coleção só calculam vetores de textos novos
+EMBED_CACHE = os.getenv("EMBED_CACHE", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".rag_state/embeddings.sqlite")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+# Cache em memória dos embeddings das perguntas do chat (LRU com TTL em segundos); 0 desativa
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+# Reformulação da pergunta com o histórico: "auto" só chama o LLM quando a pergunta depende do histórico
+# (ver question_condenser.py); "always" chama sempre que houver histórico
+CONDENSE_MODE = os.getenv("CONDENSE_MODE", "auto")
+CONDENSE_MIN_WORDS = int(os.getenv("CONDENSE_MIN_WORDS", "4"))
+CONDENSE_SIMILARITY = float(os.getenv("CONDENSE_SIMILARITY", "0.5"))
+# Cache semântico de respostas (answer_cache.py): perguntas independentes com similaridade >= limiar com
+# uma já respondida, na mesma versão do índice, recebem a resposta guardada; 0 entradas desativa
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+# Compressão dos vetores no Milvus: VECTOR_DIM trunca os embeddings (Matryoshka, ex.: 256 ou 512; 0 mantém
+# as 768 dimensões) e VECTOR_QUANTIZATION=int8 indexa com IVF_SQ8. Com compressão, o retriever busca
+# RESCORE_CANDIDATES candidatos e os reordena com os vetores completos do cache de embeddings
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "0"))
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+RESCORE_CANDIDATES = int(os.getenv("RESCORE_CANDIDATES", "20"))
+
+# Índice vetorial da coleção (FLAT, IVF_FLAT, IVF_SQ8, IVF_PQ ou HNSW), métrica e parâmetros de construção
+# em JSON (ex.: {"M": 16, "efConstruction": 200}); valem só na criação da coleção. VECTOR_NPROBE e
+# VECTOR_EF são os parâmetros de busca padrão e podem ser trocados por consulta com vector_search_params
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "IVF_SQ8" if VECTOR_QUANTIZATION == "int8" else "HNSW")
+VECTOR_METRIC = os.getenv("VECTOR_METRIC", "L2")
+VECTOR_INDEX_PARAMS = json.loads(os.getenv("VECTOR_INDEX_PARAMS", "null"))
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "16"))
+VECTOR_EF = int(os.getenv("VECTOR_EF", "64"))
+# Partições da coleção por doc_type (partition key); 0 cria a coleção sem partition key
+MILVUS_NUM_PARTITIONS = int(os.getenv("MILVUS_NUM_PARTITIONS", "16"))
+# Filtro de doc_type do retriever do chat: lista fixa (separada por vírgulas) ou escolhida pelos
+# índices de vegetação citados na pergunta (NDVI, NDWI, OSAVI...)
+RETRIEVER_DOC_TYPES = [doc_type for doc_type in os.getenv("RETRIEVER_DOC_TYPES", "").split(",") if doc_type]
+RETRIEVER_ROUTE_DOC_TYPES = os.getenv("RETRIEVER_ROUTE_DOC_TYPES", "false").lower() == "true"
+# Filtros estruturados do knowledge_base1 (pré-filtro da busca): fixos em JSON, ex.
+# {"area": "Norte", "date_from": "2024-01-01"}, ou deduzidos da pergunta (talhão, área e mês citados)
+RETRIEVER_FILTERS = json.loads(os.getenv("RETRIEVER_FILTERS", "{}"))
+RETRIEVER_ROUTE_FILTERS = os.getenv("RETRIEVER_ROUTE_FILTERS", "false").lower() == "true"
+
+def vector_compression_enabled():
+    return VECTOR_DIM > 0 or VECTOR_QUANTIZATION != "none"
+
+# Parâmetros do índice vetorial na criação da coleção
+def vector_index_params():
+    if VECTOR_QUANTIZATION not in ("none", "int8"):
+        raise ValueError(f"VECTOR_QUANTIZATION inválido: '{VECTOR_QUANTIZATION}' (use none ou int8).")
+    if VECTOR_QUANTIZATION == "int8" and VECTOR_INDEX not in ("IVF_SQ8", "IVF_PQ"):
+        raise ValueError(f"VECTOR_QUANTIZATION=int8 precisa de um índice quantizado (IVF_SQ8 ou IVF_PQ), não {VECTOR_INDEX}.")
+    return index_params(VECTOR_INDEX, VECTOR_METRIC, VECTOR_INDEX_PARAMS)
+
+# Parâmetros de busca do índice da coleção (ou do configurado, sem coleção); nprobe/ef/k sobrescrevem os padrões
+def vector_search_params(collection=None, nprobe=None, ef=None, k=4):
+    index_type, metric_type = VECTOR_INDEX, VECTOR_METRIC
+    if collection is not None:
+        for index in collection.indexes:
+            if index.field_name == "vector":
+                index_type, metric_type = index.params["index_type"], index.params["metric_type"]
+    return search_params(
+        index_type,
+        metric_type,
+        nprobe=nprobe if nprobe is not None else VECTOR_NPROBE,
+        ef=max(ef if ef is not None else VECTOR_EF, k),
+    )
+
+# Identifica o modelo e o cliente que geraram um vetor
+def embedding_model_key():
+    return EMBEDDING_MODEL if EMBEDDING_CLIENT == "ollama" else f"{EMBEDDING_MODEL}@{EMBEDDING_CLIENT}"
+
+def build_embeddings():
+    base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    if EMBEDDING_CLIENT == "batch":
+        embeddings = BatchOllamaEmbeddings(
+            model=EMBEDDING_MODEL,
+            base_url=base_url,
+            batch_size=EMBED_BATCH_SIZE,
+            max_in_flight=EMBED_MAX_IN_FLIGHT,
+            max_retries=EMBED_MAX_RETRIES,
+        )
+    else:
+        embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=base_url)
+    if EMBED_CACHE:
+        # O cache guarda sempre os vetores completos, usados também no re-ranqueamento
+        embeddings = CachedEmbeddings(embeddings, embedding_model_key(), EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES)
+    if VECTOR_DIM:
+        embeddings = TruncatedEmbeddings(embeddings, VECTOR_DIM)
+    return embeddings
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEPARATORS = ["\n\n","\n","."," ", ""]
+
+# "streaming" gera os mesmos chunks do RecursiveCharacterTextSplitter ("langchain") com menos cópias de texto
+TEXT_SPLITTER = os.getenv("TEXT_SPLITTER", "streaming")
+
+def build_splitter():
+    if TEXT_SPLITTER == "streaming":
+        return StreamingTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+
+# CHUNK_WORKERS > 1 divide os documentos num pool de processos (só com o splitter "streaming");
+# listas pequenas continuam no processo atual, onde subir o pool custaria mais que a divisão
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "1"))
+CHUNK_PARALLEL_MIN_CHARS = 4_000_000
 
 # Dividir os documentos em chunks
 def split_documents(documents):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, separators=["\n\n","\n","."," ", ""])
+    splitter = build_splitter()
+    if isinstance(splitter, StreamingTextSplitter) and CHUNK_WORKERS > 1:
+        if sum(len(doc.page_content) for doc in documents) >= CHUNK_PARALLEL_MIN_CHARS:
+            return list(iter_split_documents_parallel(documents, CHUNK_WORKERS, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS))
     return splitter.split_documents(documents)
 
+# Dividir os documentos em chunks lendo o gerador em lotes limitados
+def iter_split_documents(documents, batch_size=INGEST_BATCH_SIZE):
+    splitter = build_splitter()
+    if isinstance(splitter, StreamingTextSplitter):
+        if CHUNK_WORKERS > 1:
+            yield from iter_split_documents_parallel(documents, CHUNK_WORKERS, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS)
+        else:
+            yield from splitter.iter_documents(documents)
+        return
+    for batch in iter_batches(documents, batch_size):
+        yield from splitter.split_documents(batch)
+
 milvus_host = os.getenv("MILVUS_HOST", "milvus")
 milvus_port = os.getenv("MILVUS_PORT", "19530")
 
-# Conectar ao Milvus
+# Dono da conexão com o Milvus: todos os vectorstores e chamadas do pymilvus usam a mesma
+VECTOR_STORE = VectorStoreManager(milvus_host, milvus_port)
+# Perguntas usadas no aquecimento da busca antes de abrir o chat (separadas por "|"; vazio desativa)
+WARMUP_QUERIES = [query for query in os.getenv(
+    "WARMUP_QUERIES", "O que é NDVI?|Como interpretar o NDWI?|Quais os insights do OSAVI?|Recomendações para o talhão"
+).split("|") if query]
+WARMUP_MAX_ROUNDS = int(os.getenv("WARMUP_MAX_ROUNDS", "10"))
+
+# Backend vetorial: "milvus" (servidor do podman-compose) ou "local" (arquivos mapeados em memória,
+# sem serviço externo, para máquinas de campo e CI). Blue/green e carga em massa são só do Milvus
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "milvus")
+LOCAL_VECTOR_PATH = os.getenv("LOCAL_VECTOR_PATH", ".rag_state/vectors")
+LOCAL_IVF_NLIST = int(os.getenv("LOCAL_IVF_NLIST", "0"))
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+
+def build_vector_backend():
+    if VECTOR_BACKEND == "local":
+        return LocalBackend(LOCAL_VECTOR_PATH, VECTOR_METRIC, LOCAL_IVF_NLIST, LOCAL_IVF_NPROBE)
+    if VECTOR_BACKEND != "milvus":
+        raise ValueError(f"VECTOR_BACKEND inválido: {VECTOR_BACKEND} (use milvus ou local)")
+    return MilvusBackend(
+        VECTOR_STORE,
+        vector_index_params,
+        # ef >= k para o maior número de candidatos pedido: re-ranqueamento ou lado denso da busca híbrida
+        lambda collection: vector_search_params(collection, k=max(RESCORE_CANDIDATES, HYBRID_FETCH_K, 4)),
+        num_partitions=MILVUS_NUM_PARTITIONS,
+    )
+
+BACKEND = build_vector_backend()
+
+# Conectar ao Milvus (no backend local não há conexão)
 def connect_to_milvus():
-    connections.connect(host=milvus_host, port=milvus_port)
+    BACKEND.connect()
+
+# Deduplicação por hash de conteúdo: chunks já indexados não são enviados de novo ao embedding
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "true").lower() == "true"
+
+# Hash estável do chunk: muda se o texto, o modelo (ou cliente, ou a dimensão) de embedding ou os parâmetros do splitter mudarem
+def content_hash(text):
+    model = embedding_model_key() + (f"/{VECTOR_DIM}" if VECTOR_DIM else "")
+    key = json.dumps([model, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS, text], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def has_content_hash_field(collection):
+    return any(field.name == "content_hash" for field in collection.schema.fields)
+
+def has_scalar_fields(collection):
+    names = {field.name for field in collection.schema.fields}
+    return all(field in names for field in SCALAR_FIELD_DEFAULTS)
+
+# Dono do chunk: as remoções são por arquivo (source) ou por linha (doc_type e row_id)
+OWNER_FIELDS = ("source", "doc_type", "row_id")
+
+def dedup_key(metadata):
+    return (metadata["content_hash"], *(metadata.get(field) for field in OWNER_FIELDS))
+
+# Marca cada chunk com content_hash e descarta os repetidos do mesmo dono no lote, os já vistos nesta
+# execução (seen) e os que já estão na coleção. O mesmo texto em outro arquivo ou linha é mantido, para
+# não sumir quando o dono do primeiro for apagado; o cache de embeddings evita calcular o vetor de novo
+def dedup_chunks(chunks, collection=None, seen=None):
+    unique = {}
+    for chunk in chunks:
+        chunk.metadata["content_hash"] = content_hash(chunk.page_content)
+        unique.setdefault(dedup_key(chunk.metadata), chunk)
+    if seen is not None:
+        for key in list(unique):
+            if key in seen:
+                del unique[key]
+        seen.update(unique)
+    if collection is not None and unique:
+        digests = sorted({key[0] for key in unique})
+        # Strong: chunks removidos logo antes (troca de um arquivo ou linha) não podem contar como já indexados
+        query_kwargs = {"consistency_level": "Strong"} if BACKEND.name == "milvus" else {}
+        existing = collection.query(
+            expr=f"content_hash in {json.dumps(digests)}", output_fields=["content_hash", *OWNER_FIELDS], **query_kwargs
+        )
+        for row in existing:
+            unique.pop(dedup_key(row), None)
+    return list(unique.values())
+
+# Índice BM25 dos chunks, mantido junto com o índice vetorial (um arquivo por coleção ou alias) e
+# combinado com a busca vetorial no chat por reciprocal rank fusion
+SPARSE_INDEX = os.getenv("SPARSE_INDEX", "true").lower() == "true"
+SPARSE_INDEX_DIR = os.getenv("SPARSE_INDEX_DIR", ".rag_state/bm25")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+SPARSE_INDEXES = {}
+
+def sparse_index_path(collection_name):
+    return os.path.join(SPARSE_INDEX_DIR, f"{collection_name}.sqlite")
+
+def open_sparse_index(collection_name):
+    if collection_name not in SPARSE_INDEXES:
+        SPARSE_INDEXES[collection_name] = BM25Index(sparse_index_path(collection_name))
+    return SPARSE_INDEXES[collection_name]
+
+# Versão do índice para o cache de respostas: a coleção para a qual o alias aponta (muda na reconstrução)
+# e uma marca gravada em disco a cada escrita na coleção, por qualquer processo (rag.py, indexer.py)
+INDEX_VERSION_DIR = os.getenv("INDEX_VERSION_DIR", ".rag_state/index_version")
+ALIAS_CHECK_INTERVAL = 5.0
+ALIAS_TARGETS = {}
+
+def index_version_path(collection_name):
+    return os.path.join(INDEX_VERSION_DIR, collection_name)
+
+def mark_index_changed(collection_name):
+    path = index_version_path(collection_name)
+    os.makedirs(INDEX_VERSION_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+def read_index_mark(collection_name):
+    try:
+        with open(index_version_path(collection_name), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return "0"
+
+def index_version(alias="prediza_chunks"):
+    if BACKEND.name != "milvus":
+        return f"{alias}#{read_index_mark(alias)}"
+    checked_at, target = ALIAS_TARGETS.get(alias, (0.0, None))
+    if time.monotonic() - checked_at > ALIAS_CHECK_INTERVAL:
+        target = current_version(alias) or alias
+        ALIAS_TARGETS[alias] = (time.monotonic(), target)
+    return f"{target}#{read_index_mark(alias)}"
+
+# Chunks recém-inseridos na coleção: entram no índice BM25 e mudam a versão do índice
+def record_added_chunks(collection_name, chunks):
+    mark_index_changed(collection_name)
+    if SPARSE_INDEX:
+        open_sparse_index(collection_name).add(chunks)
+
+# Depois da troca do alias, o índice BM25 da versão passa a ser o do alias
+def promote_sparse_index(name, alias):
+    index = SPARSE_INDEXES.pop(name, None)
+    if index is not None:
+        index.close()
+    if os.path.exists(sparse_index_path(name)):
+        os.replace(sparse_index_path(name), sparse_index_path(alias))
+
+def drop_sparse_index(name):
+    index = SPARSE_INDEXES.pop(name, None)
+    if index is not None:
+        index.close()
+    if os.path.exists(sparse_index_path(name)):
+        os.remove(sparse_index_path(name))
+
+# Insere chunks em lotes numa coleção existente e retorna quantos foram inseridos
+def insert_documents(vectorstore, chunks, batch_size=INGEST_BATCH_SIZE):
+    dedup = INGEST_DEDUP and has_content_hash_field(vectorstore.col)
+    seen = set()
+    total, skipped = 0, 0
+    for batch in iter_batches(chunks, batch_size):
+        if dedup:
+            unique = dedup_chunks(batch, vectorstore.col, seen)
+            skipped += len(batch) - len(unique)
+            batch = unique
+        if batch:
+            vectorstore.add_documents(batch)
+            record_added_chunks(vectorstore.collection_name, batch)
+            total += len(batch)
+    if skipped:
+        print(f"[INFO] {skipped} chunks já indexados ou repetidos foram ignorados.")
+    return total
+
+# Vectorstore do LangChain para uma coleção existente no backend configurado
+def open_vectorstore(embeddings, collection_name):
+    return BACKEND.open_vectorstore(embeddings, collection_name)
+
+# Carga em massa na criação da coleção: os chunks vão em arquivos colunares para o bucket do Milvus no
+# MinIO e são importados com bulk_insert, em vez de inserts linha a linha (ver bulk_load.py)
+INGEST_BULK_LOAD = os.getenv("INGEST_BULK_LOAD", "false").lower() == "true"
+BULK_FILE_TYPE = os.getenv("BULK_FILE_TYPE", "npy")
+
+def build_bulk_loader(collection):
+    return MilvusBulkLoader(
+        collection,
+        endpoint=os.getenv("MINIO_ENDPOINT", "minio:9000"),
+        access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+        secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+        # Precisa ser o mesmo bucket configurado no Milvus (MINIO_BUCKET_NAME no podman-compose.yml)
+        bucket=os.getenv("MINIO_BUCKET", "milvus-bucket"),
+        remote_path=os.getenv("BULK_REMOTE_PATH", "rag_bulk"),
+        file_type=BULK_FILE_TYPE,
+    )
 
 # Inserir documentos vetoriais no Milvus
-def insert_into_milvus(chunks,collection_name="prediza_chunks", allow_append=False):
-    embeddings = OllamaEmbeddings(model="nomic-embed-text", base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
-    
-    if utility.has_collection(collection_name):
+# chunks pode ser uma lista ou um gerador; a inserção é feita em lotes de batch_size
+def insert_into_milvus(chunks,collection_name="prediza_chunks", allow_append=False, batch_size=INGEST_BATCH_SIZE):
+    embeddings = build_embeddings()
+
+    if BACKEND.has_collection(collection_name):
         print(f"[INFO] A coleção '{collection_name}' já existe")
+        vectorstore = open_vectorstore(embeddings, collection_name)
         if allow_append:
             print("[INFO] Inserindo novos documentos na coleção existente...")
-            vectorstore = Milvus(
-                embedding_function=embeddings,
-                collection_name=collection_name,
-                connection_args={"host": milvus_host, "port": milvus_port}
-            )
-            vectorstore.add_documents(chunks)
-
+            total = insert_documents(vectorstore, chunks, batch_size)
+            print(f"[INFO] {total} chunks inseridos.")
         else:
             print("[INFO] Recuperando a coleção existente sem modificá-la...")
-            vectorstore = Milvus(embedding_function=embeddings, collection_name=collection_name, connection_args={"host": milvus_host, "port": milvus_port})
     else:    
         print(f"[INFO] Criando a coleção '{collection_name}' e inserindo documentos...")
-        vectorstore = Milvus.from_documents(chunks, embedding=embeddings, collection_name=collection_name, connection_args={"host": milvus_host, "port": milvus_port})
-        print("[INFO] Dados inseridos no Milvus com sucesso.")
+        vectorstore = None
+        loader = None
+        seen = set()
+        total = 0
+        for batch in iter_batches(chunks, batch_size):
+            if INGEST_DEDUP:
+                # content_hash é sempre preenchido para que o campo exista no schema da coleção
+                batch = dedup_chunks(batch, seen=seen)
+            if not batch:
+                continue
+            if vectorstore is None and loader is None:
+                # A dimensão vem do primeiro vetor; com o cache de embeddings ele não é recalculado no add_documents
+                dim = len(embeddings.embed_documents([batch[0].page_content])[0])
+                collection = BACKEND.create_collection(collection_name, dim, with_content_hash=INGEST_DEDUP)
+                # Um índice BM25 que sobrou de uma coleção apagada não vale para a nova
+                drop_sparse_index(collection_name)
+                if INGEST_BULK_LOAD and BACKEND.name == "milvus":
+                    loader = build_bulk_loader(collection)
+                else:
+                    vectorstore = open_vectorstore(embeddings, collection_name)
+            if loader is not None:
+                loader.append(batch, embeddings.embed_documents([chunk.page_content for chunk in batch]))
+                record_added_chunks(collection_name, batch)
+                total += len(batch)
+                print(f"[INFO] {total} chunks gravados para a carga em massa...")
+                continue
+            vectorstore.add_documents(batch)
+            record_added_chunks(collection_name, batch)
+            total += len(batch)
+            print(f"[INFO] {total} chunks inseridos...")
+        if loader is not None:
+            loader.commit()
+            vectorstore = open_vectorstore(embeddings, collection_name)
+        if vectorstore is None:
+            raise RuntimeError(f"Nenhum documento para criar a coleção '{collection_name}'.")
+        print(f"[INFO] Dados inseridos no backend '{BACKEND.name}' com sucesso.")
+    cache = embeddings.embeddings if isinstance(embeddings, TruncatedEmbeddings) else embeddings
+    if isinstance(cache, CachedEmbeddings):
+        cache.report()
     return vectorstore
 
+# Cria a coleção vazia (dimensão medida num texto de teste) para que qualquer fonte possa inserir primeiro
+def create_empty_collection(collection_name="prediza_chunks"):
+    embeddings = build_embeddings()
+    dim = len(embeddings.embed_documents(["prediza"])[0])
+    print(f"[INFO] Criando a coleção vazia '{collection_name}' ({dim} dimensões)...")
+    BACKEND.create_collection(collection_name, dim, with_content_hash=INGEST_DEDUP)
+    drop_sparse_index(collection_name)
+    return open_vectorstore(embeddings, collection_name)
+
+# Estado da sincronização incremental: por tabela, os ids indexados, o maior id e a marca d'água de updated_at
+INGEST_INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "false").lower() == "true"
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", ".rag_state/pg_sync_state.json")
+# A marca d'água é o início do snapshot menos essa margem (s), não o maior updated_at: o trigger grava
+# now(), o início da transação, então um UPDATE que começou antes do snapshot e terminou depois dele
+# tem updated_at menor que o maior já visto. Linhas dentro da margem são relidas na próxima sincronização
+SYNC_WATERMARK_MARGIN = float(os.getenv("SYNC_WATERMARK_MARGIN", "300"))
+
+def sync_watermark(cursor, margin=SYNC_WATERMARK_MARGIN):
+    cursor.execute("SELECT now() - %s * interval '1 second'", (margin,))
+    return cursor.fetchone()[0]
+
+def load_sync_state(path=SYNC_STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_sync_state(state, path=SYNC_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+# Remove do Milvus (e do índice BM25) os chunks que casam com a expressão
+def delete_from_milvus(collection_name, expr):
+    BACKEND.collection(collection_name).delete(expr)
+    mark_index_changed(collection_name)
+    if SPARSE_INDEX:
+        open_sparse_index(collection_name).delete(expr)
+
+# Remove do Milvus os chunks das linhas informadas de uma tabela
+def delete_rows_from_milvus(collection_name, table, row_ids, batch_size=1000):
+    row_ids = sorted(row_ids)
+    for start in range(0, len(row_ids), batch_size):
+        ids = row_ids[start:start + batch_size]
+        delete_from_milvus(collection_name, f'doc_type == "{table}" and row_id in {ids}')
+
+# Substitui todos os chunks de uma tabela pelos documentos atuais dela
+def reindex_table(conn, vectorstore, collection_name, table):
+    delete_from_milvus(collection_name, f'doc_type == "{table}"')
+    return insert_documents(vectorstore, iter_split_documents(iter_table_documents(conn, table)))
+
+# Sincroniza uma tabela: remove vetores de linhas apagadas ou alteradas e indexa só as linhas novas/alteradas
+def sync_table(conn, vectorstore, collection_name, table, table_state):
+    columns = table_columns(conn, table)
+    if "id" not in columns:
+        # Sem chave não há como rastrear linhas: reindexa a tabela inteira
+        print(f"[WARN] Tabela '{table}' sem coluna id; reindexando por completo.")
+        return {}, reindex_table(conn, vectorstore, collection_name, table)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM {table}")
+        current_ids = {row[0] for row in cursor.fetchall()}
+        watermark = None
+        if "updated_at" in columns:
+            watermark = sync_watermark(cursor)
+        else:
+            print(f"[WARN] Tabela '{table}' sem coluna updated_at; só linhas novas e removidas são detectadas.")
+
+    first_sync = not table_state
+    if first_sync:
+        # Tabela ainda não sincronizada: descarta o que houver dela na coleção e indexa tudo
+        delete_from_milvus(collection_name, f'doc_type == "{table}"')
+        table_state = {"ids": [], "max_id": 0, "updated_at": None}
+
+    indexed_ids = set(table_state["ids"])
+    new_state = {
+        "ids": sorted(current_ids),
+        "max_id": max(current_ids, default=table_state["max_id"]),
+        "updated_at": watermark.isoformat() if watermark is not None else None,
+    }
+    if is_grouped(table):
+        # Uma linha alterada muda o documento do grupo: reindexa a tabela se algo mudou
+        updated = watermark is not None
+        if updated and table_state["updated_at"]:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE updated_at > %s)", (table_state["updated_at"],))
+                updated = cursor.fetchone()[0]
+        if indexed_ids == current_ids and not updated:
+            return new_state, 0
+        inserted = reindex_table(conn, vectorstore, collection_name, table)
+        print(f"[INFO] '{table}': tabela agrupada reindexada, {inserted} chunks inseridos.")
+        return new_state, inserted
+
+    # Linhas novas são as ids ainda não indexadas (não as acima do maior id: uma transação que termina
+    # depois da leitura pode gravar ids menores); alteradas são as com updated_at após a marca d'água
+    new_ids = sorted(current_ids - indexed_ids)
+    if first_sync:
+        where, params = "", ()
+    elif table_state["updated_at"] and watermark is not None:
+        where = "WHERE id = ANY(%s) OR updated_at > %s"
+        params = (new_ids, table_state["updated_at"])
+    else:
+        where = "WHERE id = ANY(%s)"
+        params = (new_ids,)
+
+    deleted_ids = indexed_ids - current_ids
+    if deleted_ids:
+        delete_rows_from_milvus(collection_name, table, deleted_ids)
+
+    changed, inserted = 0, 0
+    for batch in iter_batches(iter_table_documents(conn, table, where, params), INGEST_BATCH_SIZE):
+        # Linhas alteradas já indexadas têm os chunks antigos removidos antes da reinserção
+        updated_ids = {doc.metadata["row_id"] for doc in batch} & indexed_ids
+        if updated_ids:
+            delete_rows_from_milvus(collection_name, table, updated_ids)
+        inserted += insert_documents(vectorstore, split_documents(batch))
+        changed += len(batch)
+        # Linhas gravadas depois da leitura das ids também já estão indexadas
+        fetched_ids = {doc.metadata["row_id"] for doc in batch} - current_ids
+        if fetched_ids:
+            current_ids |= fetched_ids
+            new_state["ids"] = sorted(current_ids)
+            new_state["max_id"] = max(current_ids)
+    print(f"[INFO] '{table}': {changed} linhas novas/alteradas, {len(deleted_ids)} removidas, {inserted} chunks inseridos.")
+    return new_state, inserted
+
+# Sincronização incremental das tabelas do PostgreSQL com a coleção existente
+def sync_postgres_incremental(vectorstore, collection_name="prediza_chunks", reset=False):
+    state = {} if reset else load_sync_state()
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    # Todas as consultas de uma sincronização enxergam o mesmo snapshot do banco
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    try:
+        tables = list_postgres_tables(conn)
+        for table in set(state) - set(tables):
+            print(f"[INFO] Tabela '{table}' não existe mais; removendo seus vetores.")
+            delete_from_milvus(collection_name, f'doc_type == "{table}"')
+            del state[table]
+        for table in tables:
+            state[table], _ = sync_table(conn, vectorstore, collection_name, table, state.get(table))
+    finally:
+        conn.close()
+    save_sync_state(state)
+    return vectorstore
+
+# Manifesto do knowledge_base: caminho -> tamanho, mtime e hash do conteúdo já indexado
+MARKDOWN_MANIFEST_PATH = os.getenv("MARKDOWN_MANIFEST_PATH", ".rag_state/markdown_manifest.json")
+KB_READ_WORKERS = int(os.getenv("KB_READ_WORKERS", "8"))
+
+# Lista os .md de cada pasta do knowledge_base com o doc_type (nome da pasta)
+def list_markdown_files():
+    files = {}
+    for folder in glob.glob("knowledge_base/*"):
+        doc_type = os.path.basename(folder)
+        for path in glob.glob(os.path.join(folder, "**", "*.md"), recursive=True):
+            files[path] = doc_type
+    return files
+
+def read_markdown_file(path, doc_type):
+    with open(path, "rb") as f:
+        data = f.read()
+    doc = Document(page_content=data.decode("utf-8"), metadata=chunk_metadata(path, doc_type))
+    return doc, hashlib.sha256(data).hexdigest()
+
+# Compara o knowledge_base com o manifesto: só arquivos com tamanho ou mtime diferentes são lidos,
+# em paralelo, e só os com hash diferente voltam como alterados
+def scan_markdown_changes(manifest, workers=KB_READ_WORKERS):
+    files = list_markdown_files()
+    new_manifest = {}
+    candidates = []
+    for path, doc_type in files.items():
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            new_manifest[path] = entry
+        else:
+            candidates.append((path, doc_type, stat))
+
+    changed_docs = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda candidate: read_markdown_file(candidate[0], candidate[1]), candidates)
+        for (path, doc_type, stat), (doc, digest) in zip(candidates, results):
+            new_manifest[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            if manifest.get(path, {}).get("sha256") != digest:
+                changed_docs.append(doc)
+    removed = [path for path in manifest if path not in files]
+    return changed_docs, removed, new_manifest
+
+# Remove do Milvus os chunks de um arquivo do knowledge_base
+def delete_source_from_milvus(collection_name, path):
+    delete_from_milvus(collection_name, f"source == {json.dumps(path)}")
+
+# Sincronização incremental do knowledge_base: indexa arquivos novos/alterados e remove os apagados;
+# cria a coleção se ela ainda não existir
+def sync_markdown_incremental(collection_name="prediza_chunks", reset=False):
+    manifest = {} if reset else load_sync_state(MARKDOWN_MANIFEST_PATH)
+    changed_docs, removed, new_manifest = scan_markdown_changes(manifest)
+    if BACKEND.has_collection(collection_name):
+        for path in removed + [doc.metadata["source"] for doc in changed_docs if doc.metadata["source"] in manifest]:
+            delete_source_from_milvus(collection_name, path)
+    vectorstore = insert_into_milvus(split_documents(changed_docs), collection_name=collection_name, allow_append=True)
+    save_sync_state(new_manifest, MARKDOWN_MANIFEST_PATH)
+    print(f"[INFO] knowledge_base: {len(changed_docs)} arquivos novos/alterados, {len(removed)} removidos.")
+    return vectorstore
+
+# Modo watch: edições no knowledge_base são reindexadas com o Gradio no ar
+KB_WATCH = os.getenv("KB_WATCH", "false").lower() == "true"
+KB_WATCH_POLLING = os.getenv("KB_WATCH_POLLING", "false").lower() == "true"
+KB_WATCH_DEBOUNCE = float(os.getenv("KB_WATCH_DEBOUNCE", "2"))
+KB_WATCH_POLL_INTERVAL = float(os.getenv("KB_WATCH_POLL_INTERVAL", "5"))
+
+# Troca os chunks dos arquivos informados pelos do conteúdo atual; arquivos apagados só saem do índice.
+# O manifesto, se existir, é atualizado para o próximo início incremental não refazer o trabalho
+def reindex_markdown_files(paths, collection_name="prediza_chunks"):
+    files = list_markdown_files()
+    manifest = load_sync_state(MARKDOWN_MANIFEST_PATH)
+    docs = []
+    for path in paths:
+        delete_source_from_milvus(collection_name, path)
+        manifest.pop(path, None)
+        if path not in files:
+            continue
+        try:
+            stat = os.stat(path)
+            doc, digest = read_markdown_file(path, files[path])
+        except FileNotFoundError:
+            continue
+        docs.append(doc)
+        manifest[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    if docs:
+        insert_into_milvus(split_documents(docs), collection_name=collection_name, allow_append=True)
+    if os.path.exists(MARKDOWN_MANIFEST_PATH):
+        save_sync_state(manifest, MARKDOWN_MANIFEST_PATH)
+    print(f"[INFO] knowledge_base: {len(docs)} arquivos reindexados, {len(paths) - len(docs)} removidos do índice.")
+
+# Indexa o PostgreSQL e o knowledge_base na coleção (ou alias) informada; uma coleção existente só é
+# atualizada no modo incremental. Para reindexar tudo sem parar as buscas, use rebuild_collection
+def ingest_collection(collection_name):
+    if INGEST_INCREMENTAL:
+        # Sem a coleção, o manifesto e o estado salvos não valem mais: tudo é indexado de novo
+        fresh = not BACKEND.has_collection(collection_name)
+        if fresh:
+            # Criada antes das sincronizações: sem markdown, as tabelas ainda precisam de onde inserir
+            create_empty_collection(collection_name)
+        vectorstore = sync_markdown_incremental(collection_name=collection_name, reset=fresh)
+        sync_postgres_incremental(vectorstore, collection_name=collection_name, reset=fresh)
+        return vectorstore
+    if BACKEND.has_collection(collection_name):
+        # A coleção existente é usada como está: nada é lido do PostgreSQL nem do knowledge_base
+        return insert_into_milvus([], collection_name=collection_name, allow_append=False)
+    if INGEST_STREAMING:
+        # Os documentos só são lidos quando o Milvus consome os lotes
+        all_docs = itertools.chain(select_postgres_iterator(), iter_markdown_documents())
+        chunks = iter_split_documents(all_docs)
+    else:
+        postgres_docs = load_postgres_documents()
+        md_docs = load_markdown_documents()
+        all_docs = postgres_docs + md_docs
+        chunks = split_documents(all_docs)
+    return insert_into_milvus(chunks, collection_name=collection_name, allow_append=False)
+
+# Reconstrução blue/green: os dados vão para uma nova versão <alias>_v<timestamp> enquanto o alias segue
+# servindo a versão atual; depois da conferência, o alias troca de versão e as antigas são apagadas
+REBUILD_KEEP_VERSIONS = int(os.getenv("REBUILD_KEEP_VERSIONS", "1"))
+REBUILD_MIN_RATIO = float(os.getenv("REBUILD_MIN_RATIO", "0.5"))
+
+def postgres_now():
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT now()")
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+# Depois da troca do alias, reaplica o que o indexer.py gravou só na versão anterior durante a
+# reconstrução: linhas com updated_at após since, ids que faltam na coleção e ids que saíram da tabela.
+# Tabelas agrupadas são reindexadas (o cache de embeddings evita recalcular o que não mudou)
+def catch_up_collection(collection_name, since):
+    vectorstore = open_vectorstore(build_embeddings(), collection_name)
+    collection = BACKEND.collection(collection_name)
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    try:
+        for table in list_postgres_tables(conn):
+            columns = table_columns(conn, table)
+            if "id" not in columns:
+                continue
+            if is_grouped(table):
+                inserted = reindex_table(conn, vectorstore, collection_name, table)
+                print(f"[INFO] Reconstrução: '{table}' (agrupada) reindexada, {inserted} chunks inseridos.")
+                continue
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT id FROM {table}")
+                current_ids = {row[0] for row in cursor.fetchall()}
+                updated_ids = set()
+                if "updated_at" in columns:
+                    cursor.execute(f"SELECT id FROM {table} WHERE updated_at > %s", (since,))
+                    updated_ids = {row[0] for row in cursor.fetchall()}
+            indexed_ids = {row["row_id"] for row in collection.query(expr=f'doc_type == "{table}"', output_fields=["row_id"])}
+            stale_ids = (indexed_ids - current_ids) | (updated_ids & indexed_ids)
+            fetch_ids = sorted((current_ids - indexed_ids) | updated_ids)
+            if not stale_ids and not fetch_ids:
+                continue
+            if stale_ids:
+                delete_rows_from_milvus(collection_name, table, stale_ids)
+            inserted = 0
+            if fetch_ids:
+                inserted = insert_documents(vectorstore, iter_split_documents(iter_table_documents(conn, table, "WHERE id = ANY(%s)", (fetch_ids,))))
+            print(f"[INFO] Reconstrução: '{table}' com {len(fetch_ids)} linhas novas/alteradas e {len(indexed_ids - current_ids)} removidas desde o início, {inserted} chunks inseridos.")
+    finally:
+        conn.close()
+
+def rebuild_collection(alias="prediza_chunks", keep=REBUILD_KEEP_VERSIONS, min_ratio=REBUILD_MIN_RATIO):
+    if BACKEND.name != "milvus":
+        raise RuntimeError("A reconstrução blue/green usa aliases do Milvus; no backend local, apague a coleção e reinicie.")
+    name = new_version_name(alias)
+    previous = current_version(alias)
+    if previous is None and utility.has_collection(alias):
+        previous = alias
+    print(f"[INFO] Reconstruindo '{alias}' na nova versão '{name}'...")
+    started = time.perf_counter()
+    since = postgres_now() - datetime.timedelta(seconds=SYNC_WATERMARK_MARGIN)
+    try:
+        ingest_collection(name)
+        entities = verify_version(name, previous, min_ratio)
+    except Exception:
+        if utility.has_collection(name):
+            utility.drop_collection(name)
+        drop_sparse_index(name)
+        if INGEST_INCREMENTAL:
+            # O estado salvo descreve a versão descartada; sem ele, o próximo início reindexa cada tabela e arquivo
+            for path in (SYNC_STATE_PATH, MARKDOWN_MANIFEST_PATH):
+                if os.path.exists(path):
+                    os.remove(path)
+        raise
+    switch_alias(alias, name)
+    promote_sparse_index(name, alias)
+    # O indexer.py passa a escrever na nova versão a partir daqui; o que ele gravou antes fica só na antiga
+    catch_up_collection(alias, since)
+    print(f"[INFO] O alias '{alias}' aponta para '{name}' ({entities} entidades, {time.perf_counter() - started:.0f}s).")
+    gc_versions(alias, keep)
+    return name
+
+# Rota da pergunta para o cache de respostas: índices de vegetação, áreas, talhões e mês citados
+def answer_route(question):
+    return route_doc_types(question, known_doc_types), route_scalar_filters(question, known_scalar_values)
+
 def chat(question, history):
     print("Pergunta recebida:", question)
+    first_turn = not memory.chat_memory.messages
+    # Só perguntas que não dependem do histórico podem reaproveitar (e alimentar) o cache de respostas
+    cacheable = answer_cache is not None and (first_turn or is_self_contained(question, min_words=CONDENSE_MIN_WORDS))
+    if cacheable:
+        version = index_version()
+        route = answer_route(question)
+        cached = answer_cache.lookup(question, version, route)
+        stats = answer_cache.stats()
+        print(f"[INFO] Cache de respostas: {stats['hits']} acertos, {stats['misses']} faltas ({stats['hit_rate']:.1%}), {stats['entries']} respostas.")
+        if cached is not None:
+            print(f"[INFO] Resposta reaproveitada de \"{cached['question']}\" (similaridade {cached['similarity']:.3f}).")
+            memory.save_context({"question": question}, {"answer": cached["answer"]})
+            return cached["answer"]
+    if first_turn:
+        question_generator.record_first_turn()
     result = conversation_chain.invoke({"question": question})
+    if cacheable:
+        answer_cache.store(question, version, result["answer"], result["source_documents"], route)
+    stats = question_generator.stats()
+    print(f"[INFO] Reformulação da pergunta: {stats['skipped']} de {stats['turns']} turnos sem chamar o LLM ({stats['skip_rate']:.1%}; "
+          f"{stats['first_turns']} primeiros turnos, {stats['self_contained']} perguntas independentes).")
+    if query_cache is not None:
+        stats = query_cache.stats()
+        print(f"[INFO] Cache de perguntas: {stats['hits']} acertos, {stats['misses']} faltas ({stats['hit_rate']:.1%}).")
     return result["answer"]
 
 if __name__ == "__main__":
     print("Iniciando pipeline RAG...")
 
-    postgres_docs = load_postgres_documents()
-    md_docs = load_markdown_documents()
-    all_docs = postgres_docs + md_docs
-    chunks = split_documents(all_docs)
-
     connect_to_milvus()
-    vectorstore= insert_into_milvus(chunks,collection_name="prediza_chunks",allow_append=False) # manter allow_append como False
+    if not BACKEND.has_collection("prediza_chunks") and BACKEND.name == "milvus":
+        # Primeira carga: cria a primeira versão e o alias prediza_chunks, que é o que o retriever lê
+        rebuild_collection("prediza_chunks")
+        vectorstore = insert_into_milvus([], collection_name="prediza_chunks", allow_append=False)
+    else:
+        # Coleção existente: só o modo incremental a altera; reindexação completa é feita pelo rebuild.py.
+        # No backend local, a primeira carga também passa por aqui
+        vectorstore = ingest_collection("prediza_chunks")
+
+    if KB_WATCH:
+        start_watch(
+            "knowledge_base",
+            lambda paths: reindex_markdown_files(paths, collection_name="prediza_chunks"),
+            debounce=KB_WATCH_DEBOUNCE,
+            poll_interval=KB_WATCH_POLL_INTERVAL,
+            use_polling=KB_WATCH_POLLING,
+        )
 
     print("Configurando modelo e cadeia de conversação...")
     
@@ -147,11 +1184,61 @@ if __name__ == "__main__":
     Histórico do chat: {chat_history} Pergunta de acompanhamento: {question} Pergunta reformulada: """)
 
     # Cadeias
-    question_generator = LLMChain(llm=llm, prompt=condense_prompt)
+    question_generator = CondenseQuestionChain(
+        llm=llm, prompt=condense_prompt, mode=CONDENSE_MODE, min_words=CONDENSE_MIN_WORDS, similarity_threshold=CONDENSE_SIMILARITY
+    )
     qa_chain = StuffDocumentsChain(llm_chain=LLMChain(llm=llm, prompt=chat_prompt), document_variable_name="context")
 
     memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True,output_key="answer")
-    retriever = vectorstore.as_retriever()
+    # O retriever embute a pergunta reformulada com o embedding_func do vectorstore;
+    # o cache de perguntas fica antes da truncagem para servir também ao re-ranqueamento
+    full_embeddings = vectorstore.embedding_func
+    if isinstance(full_embeddings, TruncatedEmbeddings):
+        full_embeddings = full_embeddings.embeddings
+    query_cache = None
+    if QUERY_CACHE_SIZE > 0:
+        query_cache = QueryEmbeddingCache(full_embeddings, QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        full_embeddings = query_cache
+        vectorstore.embedding_func = TruncatedEmbeddings(query_cache, VECTOR_DIM) if VECTOR_DIM else query_cache
+    # Perguntas curtas são comparadas com a anterior pelos mesmos embeddings (e cache) da busca
+    question_generator.embeddings = full_embeddings
+    answer_cache = SemanticAnswerCache(full_embeddings, ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL) if ANSWER_CACHE_SIZE > 0 else None
+    # doc_types, áreas e talhões conhecidos: para o roteamento da busca e para a rota do cache de respostas
+    known_doc_types = list_doc_types() if RETRIEVER_ROUTE_DOC_TYPES or answer_cache is not None else []
+    known_scalar_values = list_scalar_values() if RETRIEVER_ROUTE_FILTERS or answer_cache is not None else {}
+    # Na busca híbrida, a busca vetorial devolve HYBRID_FETCH_K candidatos para a fusão com o BM25
+    sparse_index = open_sparse_index("prediza_chunks") if HYBRID_SEARCH and SPARSE_INDEX else None
+    if sparse_index is not None and sparse_index.count == 0:
+        print("[WARN] Índice BM25 vazio (coleção criada antes dele?); usando só a busca vetorial. Recrie a coleção (rebuild.py) para criá-lo.")
+        sparse_index = None
+    dense_k = HYBRID_FETCH_K if sparse_index is not None else 4
+    if vector_compression_enabled() and RESCORE_CANDIDATES > 0:
+        if not EMBED_CACHE:
+            print("[WARN] Re-ranqueamento sem EMBED_CACHE: os vetores completos dos candidatos serão recalculados a cada pergunta.")
+        retriever = RescoringRetriever(
+            vectorstore=vectorstore, embeddings=full_embeddings, dim=VECTOR_DIM, k=dense_k, fetch_k=max(RESCORE_CANDIDATES, dense_k)
+        )
+    else:
+        retriever = vectorstore.as_retriever(search_kwargs={"k": dense_k})
+    if sparse_index is not None:
+        retriever = HybridRetriever(dense=retriever, sparse=sparse_index, fetch_k=HYBRID_FETCH_K, rrf_k=HYBRID_RRF_K)
+    if RETRIEVER_FILTERS or RETRIEVER_ROUTE_FILTERS:
+        if has_scalar_fields(BACKEND.collection("prediza_chunks")):
+            retriever = ScalarFilterRetriever(
+                retriever=retriever,
+                filters=RETRIEVER_FILTERS,
+                known_values=known_scalar_values if RETRIEVER_ROUTE_FILTERS else {},
+                route=RETRIEVER_ROUTE_FILTERS,
+            )
+        else:
+            print("[WARN] A coleção foi criada sem os campos date/area/name/feature; filtros estruturados ignorados até a próxima reconstrução.")
+    if RETRIEVER_DOC_TYPES or RETRIEVER_ROUTE_DOC_TYPES:
+        retriever = DocTypeRoutingRetriever(
+            retriever=retriever,
+            doc_types=RETRIEVER_DOC_TYPES or None,
+            known_doc_types=known_doc_types if RETRIEVER_ROUTE_DOC_TYPES else [],
+            route=RETRIEVER_ROUTE_DOC_TYPES,
+        )
 
     # Cadeia final com logs
     conversation_chain = ConversationalRetrievalChain(
@@ -162,6 +1249,10 @@ if __name__ == "__main__":
         return_source_documents=True
     )
 
+    # Coleção carregada e buscas aquecidas antes de aceitar perguntas
+    BACKEND.load("prediza_chunks")
+    VECTOR_STORE.warmup(vectorstore, WARMUP_QUERIES, max_rounds=WARMUP_MAX_ROUNDS)
+
     print("Pipeline RAG finalizado. Iniciando Gradio...")
 
     # Interface Gradio
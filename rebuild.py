@@ -0,0 +1,15 @@
+# Reconstrução completa do índice sem parar o chat: cria uma nova versão da coleção, confere e
+# troca o alias prediza_chunks para ela (ver rebuild_collection em rag.py)
+#
+# Uso: python rebuild.py (pode rodar com o rag.py e o indexer.py no ar)
+
+from rag import connect_to_milvus, rebuild_collection
+
+COLLECTION_NAME = "prediza_chunks"
+
+def main():
+    connect_to_milvus()
+    rebuild_collection(COLLECTION_NAME)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Filtro de busca por doc_type (tabela do PostgreSQL ou pasta do knowledge_base)
+# Na coleção com partition key em doc_type, a expressão doc_type in [...] faz o Milvus buscar só nas
+# partições desses tipos. DocTypeRoutingRetriever aplica o filtro a qualquer retriever que aceite expr
+# (o do vectorstore, o RescoringRetriever e o HybridRetriever): fixo (doc_types) ou escolhido pelos
+# índices citados na pergunta.
+#
+# Busca híbrida: HybridRetriever junta os resultados da busca vetorial e do índice BM25
+# (sparse_index.py) por reciprocal rank fusion.
+#
+# Filtros estruturados: ScalarFilterRetriever traduz intervalo de datas, área, talhão (name) e feature
+# do knowledge_base1 numa expressão sobre os campos escalares, aplicada como pré-filtro da busca.
+
+import calendar
+import datetime
+import json
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, List, Optional
+
+from langchain_core.retrievers import BaseRetriever
+
+# Índices de vegetação que dão nome às tabelas (ndwi_insights, osavi_fenologico...)
+VEGETATION_INDICES = ("ndvi", "gndvi", "ndwi", "osavi", "savi", "recl")
+
+def doc_type_expr(doc_types):
+    return f"doc_type in {json.dumps(sorted(doc_types), ensure_ascii=False)}"
+
+# doc_types cujo nome tem como parte um índice citado na pergunta ("NDWI" -> ndwi_interpretation, ndwi_insights)
+def route_doc_types(question, known_doc_types):
+    words = set(re.findall(r"\w+", question.casefold()))
+    cited = words.intersection(VEGETATION_INDICES)
+    return sorted(doc_type for doc_type in known_doc_types if cited.intersection(doc_type.casefold().split("_")))
+
+MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+# Texto em minúsculas e sem acentos, para comparar nomes citados na pergunta
+def fold(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+# Data (date, datetime ou texto AAAA-MM-DD) no formato AAAAMMDD do campo date
+def date_to_int(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    return int(str(value)[:10].replace("-", ""))
+
+# Expressão dos filtros estruturados; area, name e feature aceitam um valor ou uma lista
+def scalar_filter_expr(date_from=None, date_to=None, area=None, name=None, feature=None):
+    clauses = []
+    if date_from:
+        clauses.append(f"date >= {date_to_int(date_from)}")
+    if date_to:
+        clauses.append(f"date <= {date_to_int(date_to)}")
+    for field, values in (("area", area), ("name", name), ("feature", feature)):
+        if values:
+            values = [values] if isinstance(values, str) else values
+            clauses.append(f"{field} in {json.dumps(sorted(values), ensure_ascii=False)}")
+    return " and ".join(clauses)
+
+# Filtros citados na pergunta: áreas e talhões conhecidos (known_values = {"area": [...], "name": [...]})
+# e um mês ("maio de 2024", "05/2024")
+def route_scalar_filters(question, known_values):
+    text = fold(question)
+    filters = {}
+    for field, values in known_values.items():
+        cited = sorted(value for value in values if value and re.search(rf"\b{re.escape(fold(value))}\b", text))
+        if cited:
+            filters[field] = cited
+    month = re.search(rf"\b({'|'.join(MONTHS)})\s+(?:de\s+)?(\d{{4}})\b", text)
+    if month:
+        number, year = MONTHS[month.group(1)], int(month.group(2))
+    else:
+        month = re.search(r"\b(0?[1-9]|1[0-2])/(\d{4})\b", text)
+        if month:
+            number, year = int(month.group(1)), int(month.group(2))
+    if month:
+        filters["date_from"] = datetime.date(year, number, 1)
+        filters["date_to"] = datetime.date(year, number, calendar.monthrange(year, number)[1])
+    return filters
+
+class DocTypeRoutingRetriever(BaseRetriever):
+    retriever: Any
+    doc_types: Optional[List[str]] = None
+    known_doc_types: List[str] = []
+    route: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager=None, **kwargs):
+        doc_types = self.doc_types
+        if not doc_types and self.route:
+            doc_types = route_doc_types(query, self.known_doc_types) or None
+        if doc_types and "expr" not in kwargs:
+            kwargs["expr"] = doc_type_expr(doc_types)
+        return self.retriever.invoke(query, **kwargs)
+
+# Um chunk é o mesmo nas duas buscas se tiver a mesma origem e o mesmo texto
+def chunk_key(doc):
+    return (doc.metadata.get("source"), doc.metadata.get("row_id"), doc.page_content)
+
+# Soma 1 / (rrf_k + posição) de cada lista em que o documento aparece; retorna os k melhores
+def reciprocal_rank_fusion(result_lists, k=4, rrf_k=60):
+    scores = defaultdict(float)
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = chunk_key(doc)
+            scores[key] += 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+class HybridRetriever(BaseRetriever):
+    # dense deve devolver fetch_k documentos (ex.: as_retriever(search_kwargs={"k": fetch_k}))
+    dense: Any
+    sparse: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None, **kwargs):
+        dense_docs = self.dense.invoke(query, **kwargs)
+        sparse_docs = [doc for doc, _ in self.sparse.search(query, self.fetch_k, expr=kwargs.get("expr"))]
+        return reciprocal_rank_fusion([dense_docs, sparse_docs], self.k, self.rrf_k)
+
+class ScalarFilterRetriever(BaseRetriever):
+    # filters fixos, os citados na pergunta (route) e os passados por consulta (invoke(..., filters={...}))
+    retriever: Any
+    filters: dict = {}
+    known_values: dict = {}
+    route: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager=None, **kwargs):
+        routed = route_scalar_filters(query, self.known_values) if self.route else {}
+        explicit = {**self.filters, **(kwargs.pop("filters", None) or {})}
+        expr = scalar_filter_expr(**{**routed, **explicit})
+        if not expr:
+            return self.retriever.invoke(query, **kwargs)
+        base_expr = kwargs.get("expr")
+        docs = self.retriever.invoke(query, **{**kwargs, "expr": f"{base_expr} and {expr}" if base_expr else expr})
+        # Um filtro deduzido da pergunta que não encontra nada não deve deixar o chat sem contexto
+        if not docs and routed and not explicit:
+            docs = self.retriever.invoke(query, **kwargs)
+        return docs
@@ -0,0 +1,191 @@
+# Índice lexical BM25 dos mesmos chunks do índice vetorial, para termos exatos que a busca densa perde
+# ("OSAVI", o nome de um talhão, faixas como "0,2 a 0,4")
+# O índice invertido fica em SQLite (.rag_state/bm25/<coleção>.sqlite) e é atualizado junto com o
+# Milvus: os chunks inseridos entram aqui e as remoções usam as mesmas expressões (source == ...,
+# doc_type == ... and row_id in [...]). O arquivo pode ser trocado por outro (reconstrução blue/green):
+# a conexão é reaberta quando o inode do caminho muda.
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from local_vectorstore import parse_expr
+
+# Metadados guardados em colunas, para filtros e remoções (os escalares do knowledge_base1 no fim)
+FILTER_FIELDS = ("source", "doc_type", "row_id", "content_hash", "date", "area", "name", "feature")
+
+# Números com separador decimal ficam inteiros ("0,2", "12.5"); o resto vira palavras sem acento
+TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]+")
+STOPWORDS = frozenset(
+    "a ao aos as com da das de do dos e em for is na nas no nos o of os ou para pela pelas pelo pelos por "
+    "qual quais que se sem seu sua seus suas sobre the um uma umas uns".split()
+)
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token.replace(".", ",") for token in TOKEN.findall(text) if token not in STOPWORDS]
+
+# Cláusula WHERE (com parâmetros) para uma expressão de filtro no formato do Milvus
+def expr_to_sql(expr):
+    conditions, params = [], []
+    for field, comparison, value in parse_expr(expr):
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Campo '{field}' não existe no índice BM25.")
+        if comparison == "in":
+            conditions.append(f"{field} IN ({','.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            conditions.append(f"{field} {comparison} ?")
+            params.append(value)
+    return " AND ".join(conditions) or "1", params
+
+class BM25Index:
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.conn = None
+        self.inode = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                source TEXT,
+                doc_type TEXT,
+                row_id INTEGER,
+                content_hash TEXT,
+                length INTEGER NOT NULL,
+                date INTEGER,
+                area TEXT,
+                name TEXT,
+                feature TEXT
+            );
+            CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+            CREATE INDEX IF NOT EXISTS docs_doc_type ON docs (doc_type, row_id);
+            CREATE INDEX IF NOT EXISTS docs_content_hash ON docs (content_hash);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 0), docs INTEGER NOT NULL, length INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats VALUES (0, 0, 0);
+        """)
+        # Índices criados antes dos campos escalares
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(docs)")}
+        for field in FILTER_FIELDS:
+            if field not in columns:
+                conn.execute(f"ALTER TABLE docs ADD COLUMN {field} {'INTEGER' if field == 'date' else 'TEXT'}")
+        conn.execute("CREATE INDEX IF NOT EXISTS docs_scalars ON docs (name, date)")
+        return conn
+
+    # Conexão atual; reaberta se o arquivo foi substituído ou apagado
+    def _db(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self.conn is None or inode != self.inode:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = self._connect()
+            self.inode = os.stat(self.path).st_ino
+        return self.conn
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    @property
+    def count(self):
+        with self.lock:
+            return self._db().execute("SELECT docs FROM stats").fetchone()[0]
+
+    def add(self, chunks):
+        with self.lock:
+            conn = self._db()
+            total_length = 0
+            with conn:
+                for chunk in chunks:
+                    terms = Counter(tokenize(chunk.page_content))
+                    length = sum(terms.values())
+                    total_length += length
+                    metadata = chunk.metadata
+                    cursor = conn.execute(
+                        f"INSERT INTO docs (text, metadata, length, {', '.join(FILTER_FIELDS)}) VALUES (?, ?, ?{', ?' * len(FILTER_FIELDS)})",
+                        (chunk.page_content, json.dumps(metadata, ensure_ascii=False), length, *(metadata.get(field) for field in FILTER_FIELDS)),
+                    )
+                    conn.executemany(
+                        "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                        [(term, cursor.lastrowid, tf) for term, tf in terms.items()],
+                    )
+                conn.execute("UPDATE stats SET docs = docs + ?, length = length + ?", (len(chunks), total_length))
+
+    def delete(self, expr):
+        where, params = expr_to_sql(expr)
+        with self.lock:
+            conn = self._db()
+            with conn:
+                rows = conn.execute(f"SELECT id, length FROM docs WHERE {where}", params).fetchall()
+                conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(doc_id,) for doc_id, _ in rows])
+                conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id, _ in rows])
+                conn.execute("UPDATE stats SET docs = docs - ?, length = length - ?", (len(rows), sum(length for _, length in rows)))
+        return len(rows)
+
+    def clear(self):
+        with self.lock:
+            conn = self._db()
+            with conn:
+                conn.execute("DELETE FROM postings")
+                conn.execute("DELETE FROM docs")
+                conn.execute("UPDATE stats SET docs = 0, length = 0")
+
+    # Os k chunks com maior BM25 para a consulta, com o score; expr filtra como na busca vetorial
+    def search(self, query, k=20, expr=None):
+        terms = set(tokenize(query))
+        where, params = expr_to_sql(expr) if expr else ("1", [])
+        with self.lock:
+            conn = self._db()
+            docs, total_length = conn.execute("SELECT docs, length FROM stats").fetchone()
+            if not docs or not terms:
+                return []
+            average_length = total_length / docs
+            scores = Counter()
+            for term in terms:
+                (df,) = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()
+                if not df:
+                    continue
+                idf = math.log(1 + (docs - df + 0.5) / (df + 0.5))
+                rows = conn.execute(
+                    f"SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ? AND {where}",
+                    [term, *params],
+                )
+                for doc_id, tf, length in rows:
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+            best = scores.most_common(k)
+            if not best:
+                return []
+            placeholders = ",".join("?" * len(best))
+            found = {
+                doc_id: Document(page_content=text, metadata=json.loads(metadata))
+                for doc_id, text, metadata in conn.execute(f"SELECT id, text, metadata FROM docs WHERE id IN ({placeholders})", [doc_id for doc_id, _ in best])
+            }
+        return [(found[doc_id], score) for doc_id, score in best]
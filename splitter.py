@@ -0,0 +1,167 @@
+# Splitter de texto em streaming com os mesmos chunks do RecursiveCharacterTextSplitter do LangChain
+# (keep_separator=True, strip_whitespace=True, length_function=len, separadores literais).
+#
+# Em vez de quebrar o texto em substrings a cada nível da recursão, o splitter trabalha só com
+# offsets (início, fim) do texto original: os separadores de cada trecho são localizados numa única
+# passada com str.find, os trechos são combinados por uma janela deslizante de offsets e cada chunk
+# é fatiado uma única vez, no momento em que é gerado. Os chunks saem de forma preguiçosa.
+
+import copy
+import itertools
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.docstore.document import Document
+
+# Janela deslizante equivalente ao _merge_splits do LangChain para trechos contíguos:
+# recebe offsets e devolve no máximo um chunk por trecho recebido
+class ChunkMerger:
+    def __init__(self, text, chunk_size, chunk_overlap):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.window = deque()
+        self.total = 0
+
+    def push(self, start, end):
+        length = end - start
+        chunk = None
+        if self.total + length > self.chunk_size and self.window:
+            chunk = self.join()
+            while self.total > self.chunk_overlap or (self.total + length > self.chunk_size and self.total > 0):
+                first_start, first_end = self.window.popleft()
+                self.total -= first_end - first_start
+        self.window.append((start, end))
+        self.total += length
+        return chunk
+
+    def flush(self):
+        chunk = self.join() if self.window else None
+        self.window.clear()
+        self.total = 0
+        return chunk
+
+    def join(self):
+        return strip_span(self.text, self.window[0][0], self.window[-1][1])
+
+# Offsets de text[start:end].strip(), ou None se o trecho só tiver espaços
+def strip_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if end > start else None
+
+# Offsets dos trechos de text[start:end] quebrados em cada ocorrência do separador, que fica no início do trecho
+def iter_spans(text, start, end, separator):
+    if not separator:
+        for position in range(start, end):
+            yield position, position + 1
+        return
+    step = len(separator)
+    previous = start
+    position = text.find(separator, start, end)
+    while position != -1:
+        if position > previous:
+            yield previous, position
+        previous = position
+        position = text.find(separator, position + step, end)
+    if end > previous:
+        yield previous, end
+
+class StreamingTextSplitter:
+    def __init__(self, chunk_size=1000, chunk_overlap=200, separators=None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) maior que chunk_size ({chunk_size}).")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or ["\n\n", "\n", " ", ""]
+
+    # Offsets (início, fim) de cada chunk no texto
+    def iter_offsets(self, text):
+        yield from self._split(text, 0, len(text), self.separators)
+
+    def iter_text(self, text):
+        for start, end in self.iter_offsets(text):
+            yield text[start:end]
+
+    def split_text(self, text):
+        return list(self.iter_text(text))
+
+    # Um Document por chunk, com cópia dos metadados do documento de origem (como no LangChain)
+    def iter_documents(self, documents):
+        for doc in documents:
+            for chunk in self.iter_text(doc.page_content):
+                yield Document(page_content=chunk, metadata=copy.deepcopy(doc.metadata))
+
+    def split_documents(self, documents):
+        return list(self.iter_documents(documents))
+
+    def _split(self, text, start, end, separators):
+        # Primeiro separador presente no trecho; os seguintes ficam para os trechos grandes demais
+        separator, remaining = separators[-1], []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator, remaining = candidate, separators[i + 1:]
+                break
+
+        merger = ChunkMerger(text, self.chunk_size, self.chunk_overlap)
+        for span_start, span_end in iter_spans(text, start, end, separator):
+            if span_end - span_start < self.chunk_size:
+                chunk = merger.push(span_start, span_end)
+                if chunk is not None:
+                    yield chunk
+                continue
+            chunk = merger.flush()
+            if chunk is not None:
+                yield chunk
+            if remaining:
+                yield from self._split(text, span_start, span_end, remaining)
+            else:
+                yield span_start, span_end
+        chunk = merger.flush()
+        if chunk is not None:
+            yield chunk
+
+# Divisão em vários processos: cada shard é um grupo de documentos consecutivos (os chunks de um mesmo
+# arquivo chegam juntos dos loaders) com cerca de shard_chars caracteres. Só os textos vão para os
+# workers, que devolvem apenas os offsets dos chunks num array de inteiros; o processo principal
+# fatia o próprio texto e copia os metadados (doc_type, source...). A ordem dos chunks é a mesma da
+# divisão sequencial e no máximo 2 * workers shards ficam em processamento ao mesmo tempo.
+def split_shard(texts, chunk_size, chunk_overlap, separators):
+    splitter = StreamingTextSplitter(chunk_size, chunk_overlap, separators)
+    return [array("q", itertools.chain.from_iterable(splitter.iter_offsets(text))) for text in texts]
+
+def iter_shards(documents, shard_chars):
+    shard, size = [], 0
+    for doc in documents:
+        shard.append(doc)
+        size += len(doc.page_content)
+        if size >= shard_chars:
+            yield shard
+            shard, size = [], 0
+    if shard:
+        yield shard
+
+def iter_split_documents_parallel(documents, workers, chunk_size=1000, chunk_overlap=200, separators=None, shard_chars=2_000_000):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(shard):
+            texts = [doc.page_content for doc in shard]
+            return shard, executor.submit(split_shard, texts, chunk_size, chunk_overlap, separators)
+
+        shards = iter_shards(documents, shard_chars)
+        pending = deque(submit(shard) for shard in itertools.islice(shards, workers * 2))
+        while pending:
+            shard, future = pending.popleft()
+            offsets_per_doc = future.result()
+            next_shard = next(shards, None)
+            if next_shard is not None:
+                pending.append(submit(next_shard))
+            for doc, offsets in zip(shard, offsets_per_doc):
+                text = doc.page_content
+                for i in range(0, len(offsets), 2):
+                    yield Document(page_content=text[offsets[i]:offsets[i + 1]], metadata=copy.deepcopy(doc.metadata))
@@ -0,0 +1,65 @@
+# Benchmark da divisão em chunks com vários processos (iter_split_documents_parallel)
+# Mede chunks/s e o ganho sobre a divisão num único processo para cada número de workers,
+# conferindo que os chunks e a ordem são os mesmos da divisão sequencial. Mostra também o estágio
+# dos workers isolado (só offsets), já que a criação dos Documents no processo principal é sequencial.
+#
+# Uso (a partir da raiz do projeto):
+#   python utils/bench/bench_chunking_mp.py --size 200 --workers 1 2 4 8 16
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from bench_splitter import CHUNK_OVERLAP, CHUNK_SIZE, SEPARATORS, build_corpus
+from splitter import StreamingTextSplitter, iter_shards, iter_split_documents_parallel, split_shard
+
+# Só o estágio paralelo: shards divididos nos workers, sem montar os Documents
+def split_offsets_only(docs, workers, shard_chars):
+    shards = [[doc.page_content for doc in shard] for shard in iter_shards(docs, shard_chars)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(split_shard, texts, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS) for texts in shards]
+        return sum(len(offsets) // 2 for future in futures for offsets in future.result())
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalabilidade da divisão em chunks com pool de processos.")
+    parser.add_argument("--size", type=int, default=200, help="tamanho do corpus em MB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--shard-chars", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    docs, total = build_corpus(args.size)
+    print(f"Corpus de {total / 1_000_000:.0f} MB em {len(docs)} documentos, {os.cpu_count()} CPUs")
+
+    splitter = StreamingTextSplitter(CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS)
+    started = time.perf_counter()
+    expected = [(chunk.page_content, chunk.metadata["source"]) for chunk in splitter.iter_documents(docs)]
+    baseline = time.perf_counter() - started
+    started = time.perf_counter()
+    for doc in docs:
+        for _ in splitter.iter_offsets(doc.page_content):
+            pass
+    baseline_offsets = time.perf_counter() - started
+    print(f"{'sequencial':>12}: {len(expected)} chunks em {baseline:.2f}s -> {len(expected) / baseline:,.0f} chunks/s "
+          f"| só offsets: {baseline_offsets:.2f}s")
+
+    for workers in args.workers:
+        started = time.perf_counter()
+        chunks = [
+            (chunk.page_content, chunk.metadata["source"])
+            for chunk in iter_split_documents_parallel(docs, workers, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS, args.shard_chars)
+        ]
+        elapsed = time.perf_counter() - started
+        if chunks != expected:
+            raise SystemExit(f"[ERRO] Chunks diferentes da divisão sequencial com {workers} workers")
+        started = time.perf_counter()
+        split_offsets_only(docs, workers, args.shard_chars)
+        elapsed_offsets = time.perf_counter() - started
+        print(f"{workers:>4} workers: {len(chunks)} chunks em {elapsed:.2f}s -> {len(chunks) / elapsed:,.0f} chunks/s "
+              f"(ganho {baseline / elapsed:.2f}x) | só offsets: {elapsed_offsets:.2f}s (ganho {baseline_offsets / elapsed_offsets:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Latência e recall do backend vetorial local (local_vectorstore.py)
+# Cria uma coleção temporária com vetores sintéticos, mede p50/p99 da busca exata e, com --nlist, da busca
+# IVF para cada nprobe (recall@k contra a busca exata). Não precisa de Milvus nem de Ollama.
+#
+# Uso (a partir da raiz do projeto):
+#   python utils/bench/bench_local_vectorstore.py --count 20000 --nlist 128 --nprobe 4 8 16
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from local_vectorstore import LocalCollection, drop_local_collection
+
+def measure(collection, queries, k, nprobe=8):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = collection.search(query, k, nprobe=nprobe)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({doc.metadata["row_id"] for doc, _ in hits})
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), results
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência e recall do backend vetorial local.")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, default=0, help="listas do IVF (0 mede só a busca exata)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    topics = rng.standard_normal((64, args.dim))
+    vectors = (topics[rng.integers(0, len(topics), args.count)] + 0.5 * rng.standard_normal((args.count, args.dim))).astype(np.float32)
+    queries = vectors[rng.choice(args.count, args.queries, replace=False)] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench")
+    try:
+        collection = LocalCollection.create(path, args.dim, ["source", "doc_type", "row_id"])
+        started = time.perf_counter()
+        for start in range(0, args.count, 1000):
+            batch = vectors[start:start + 1000]
+            metadatas = [{"source": "bench", "doc_type": "bench", "row_id": start + i} for i in range(len(batch))]
+            collection.insert([""] * len(batch), batch, metadatas)
+        print(f"{args.count} vetores de {args.dim} dimensões inseridos em {time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'busca':>14} | {'p50':>8} | {'p99':>8} | {'recall@k':>8}")
+        p50, p99, expected = measure(collection, queries, args.k)
+        print(f"{'exata':>14} | {p50:>6.2f}ms | {p99:>6.2f}ms | {1.0:>8.3f}")
+        if args.nlist:
+            collection.train_ivf(args.nlist)
+            for nprobe in args.nprobe:
+                p50, p99, found = measure(collection, queries, args.k, nprobe)
+                recall = np.mean([len(f & e) / len(e) for f, e in zip(found, expected)])
+                print(f"{'ivf/' + str(nprobe):>14} | {p50:>6.2f}ms | {p99:>6.2f}ms | {recall:>8.3f}")
+    finally:
+        drop_local_collection(os.path.dirname(path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Benchmark dos backends de exportação do PostgreSQL usados na ingestão do RAG
+# Cria uma tabela sintética no formato da knowledge_base1 e compara o cursor nomeado com o COPY
+#
+# Uso (a partir da raiz do projeto, com o PostgreSQL do podman-compose no ar):
+#   POSTGRES_HOST=localhost POSTGRES_PORT=5433 python utils/bench/bench_pg_export.py --rows 1000000
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import psycopg2
+from rag import POSTGRES_CONFIG, iter_table_documents
+
+TABLE = "bench_export_kb"
+
+def create_synthetic_table(conn, rows):
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            cur.execute(f"""
+                CREATE TABLE {TABLE} (
+                    id SERIAL PRIMARY KEY,
+                    date DATE NOT NULL,
+                    area TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    feature TEXT NOT NULL,
+                    data_type TEXT NOT NULL,
+                    insights TEXT,
+                    recommendation TEXT,
+                    responsible TEXT
+                )
+            """)
+            cur.execute(f"""
+                INSERT INTO {TABLE} (date, area, name, feature, data_type, insights, recommendation, responsible)
+                SELECT DATE '2024-01-01' + (i %% 365),
+                       'Area ' || (i %% 50),
+                       'Talhao ' || (i %% 400),
+                       (ARRAY['NDVI', 'NDWI', 'GNDVI', 'OSAVI', 'SAVI', 'RECL'])[1 + i %% 6],
+                       'indice',
+                       'Vigor vegetativo ' || (i %% 7) || ' com variação de ' || round((random() * 0.8)::numeric, 2),
+                       CASE WHEN i %% 5 = 0 THEN NULL ELSE 'Monitorar o talhão e ajustar a irrigação' END,
+                       'Agronomo ' || (i %% 20)
+                FROM generate_series(1, %s) AS i
+            """, (rows,))
+            cur.execute(f"ANALYZE {TABLE}")
+
+def run(conn, export):
+    started = time.perf_counter()
+    count = 0
+    chars = 0
+    for doc in iter_table_documents(conn, TABLE, export=export):
+        count += 1
+        chars += len(doc.page_content)
+    elapsed = time.perf_counter() - started
+    conn.rollback()
+    return count, chars, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara cursor nomeado e COPY na exportação de linhas para documentos.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="não apaga a tabela sintética no final")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        print(f"Criando {TABLE} com {args.rows} linhas...")
+        create_synthetic_table(conn, args.rows)
+        for export in ("cursor", "copy"):
+            best = None
+            for _ in range(args.repeat):
+                count, chars, elapsed = run(conn, export)
+                best = elapsed if best is None else min(best, elapsed)
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{export:>6}: {count} documentos ({chars} caracteres) em {best:.2f}s "
+                  f"-> {count / best:,.0f} linhas/s | pico de RSS acumulado: {rss_mb:.0f} MB")
+    finally:
+        if not args.keep:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
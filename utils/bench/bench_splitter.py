@@ -0,0 +1,109 @@
+# Benchmark do StreamingTextSplitter contra o RecursiveCharacterTextSplitter do LangChain
+# Gera markdown sintético (títulos, parágrafos, listas e linhas longas) e mede chunks/s e pico de memória
+# alocada durante a divisão; com --check confere se os chunks gerados são idênticos.
+#
+# Uso (a partir da raiz do projeto):
+#   python utils/bench/bench_splitter.py --sizes 10 100 1000
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from langchain.docstore.document import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from splitter import StreamingTextSplitter
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEPARATORS = ["\n\n", "\n", ".", " ", ""]
+WORDS = (
+    "ndvi ndwi gndvi osavi savi recl vigor vegetativo talhão irrigação estresse hídrico clorofila "
+    "biomassa cultura safra solo exposto fenológico recomendação monitorar aplicar nitrogênio "
+    "índice faixa valores baixa moderada alta densa"
+).split()
+
+def synthetic_markdown(rng, target_chars):
+    parts = []
+    size = 0
+    section = 0
+    while size < target_chars:
+        section += 1
+        kind = rng.random()
+        if kind < 0.15:
+            block = f"## Seção {section}: {' '.join(rng.choices(WORDS, k=4))}"
+        elif kind < 0.35:
+            block = "\n".join(f"- {' '.join(rng.choices(WORDS, k=rng.randint(3, 12)))}" for _ in range(rng.randint(2, 8)))
+        elif kind < 0.40:
+            # Linha longa sem quebras, que força a recursão até o separador " "
+            block = " ".join(rng.choices(WORDS, k=rng.randint(300, 600)))
+        else:
+            sentences = (" ".join(rng.choices(WORDS, k=rng.randint(6, 20))).capitalize() for _ in range(rng.randint(2, 10)))
+            block = ". ".join(sentences) + "."
+        parts.append(block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+# Documentos de ~64 KB até somar size_mb megabytes
+def build_corpus(size_mb, seed=42, doc_chars=64_000):
+    rng = random.Random(seed)
+    docs = []
+    total = 0
+    while total < size_mb * 1_000_000:
+        text = synthetic_markdown(rng, doc_chars)
+        docs.append(Document(page_content=text, metadata={"source": f"bench/{len(docs)}.md", "doc_type": "bench"}))
+        total += len(text)
+    return docs, total
+
+def run_langchain(docs):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    return len(splitter.split_documents(docs))
+
+def run_streaming(docs):
+    splitter = StreamingTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    return sum(1 for _ in splitter.iter_documents(docs))
+
+def measure(run, docs, memory):
+    started = time.perf_counter()
+    count = run(docs)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if memory:
+        tracemalloc.start()
+        run(docs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return count, elapsed, peak
+
+def check_equal(docs):
+    langchain_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    streaming_splitter = StreamingTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    for doc in docs:
+        if langchain_splitter.split_text(doc.page_content) != streaming_splitter.split_text(doc.page_content):
+            raise SystemExit(f"[ERRO] Chunks diferentes em {doc.metadata['source']}")
+    print("Chunks idênticos aos do RecursiveCharacterTextSplitter.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara StreamingTextSplitter e RecursiveCharacterTextSplitter.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="tamanhos do corpus em MB")
+    parser.add_argument("--no-memory", action="store_true", help="não mede o pico de memória (mais rápido)")
+    parser.add_argument("--check", action="store_true", help="confere se os chunks são idênticos")
+    args = parser.parse_args()
+
+    for size_mb in args.sizes:
+        docs, total = build_corpus(size_mb)
+        print(f"\nCorpus de {total / 1_000_000:.0f} MB em {len(docs)} documentos")
+        if args.check:
+            check_equal(docs)
+        for name, run in (("langchain", run_langchain), ("streaming", run_streaming)):
+            count, elapsed, peak = measure(run, docs, not args.no_memory)
+            memory = f" | pico de memória: {peak / 1_000_000:.1f} MB" if peak is not None else ""
+            print(f"{name:>10}: {count} chunks em {elapsed:.2f}s -> {count / elapsed:,.0f} chunks/s "
+                  f"({total / 1_000_000 / elapsed:.1f} MB/s){memory}")
+
+if __name__ == "__main__":
+    main()
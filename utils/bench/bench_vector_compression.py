@@ -0,0 +1,106 @@
+# Relatório de memória x recall da compressão de vetores (vector_compression.py)
+# Usa os vetores completos do cache de embeddings (.rag_state/embeddings.sqlite): parte dos chunks
+# vira consulta e o restante é o corpus. Para cada configuração (float32, Matryoshka 512/256, int8 e
+# binário) mede bytes por vetor e recall@k contra a busca exata com os vetores completos, sem e com
+# re-ranqueamento de fetch_k candidatos. A busca é exata em todas as configurações, para isolar a
+# perda da compressão da perda do índice ANN.
+#
+# Uso (a partir da raiz do projeto):
+#   python utils/bench/bench_vector_compression.py --queries 200 --k 4 --fetch-k 20
+#   python utils/bench/bench_vector_compression.py --synthetic 50000   # sem cache, vetores sintéticos
+
+import argparse
+import os
+import sqlite3
+import sys
+from array import array
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from vector_compression import dequantize_int8, quantize_binary, quantize_int8
+
+def load_cached_vectors(path, model):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT vector FROM embeddings WHERE model = ? AND kind = 'document'", (model,)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        raise SystemExit(f"[ERRO] Nenhum vetor do modelo '{model}' em '{path}'; rode o rag.py ou use --synthetic.")
+    return np.array([array("f", blob) for (blob,) in rows], dtype=np.float32)
+
+# Vetores com variância decrescente por dimensão, imitando a ordenação de um modelo Matryoshka
+def synthetic_vectors(count, dim=768, seed=42):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((64, dim)) * np.linspace(1.0, 0.1, dim)
+    vectors = topics[rng.integers(0, len(topics), count)] + 0.5 * rng.standard_normal((count, dim)) * np.linspace(1.0, 0.1, dim)
+    return vectors.astype(np.float32)
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+def top_k(scores, k):
+    part = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+# Distância de Hamming negativa como score (maior é melhor)
+def hamming_scores(query_codes, codes):
+    scores = np.empty((len(query_codes), len(codes)), dtype=np.float32)
+    for i, query in enumerate(query_codes):
+        scores[i] = -np.unpackbits(np.bitwise_xor(codes, query), axis=1).sum(axis=1, dtype=np.int32)
+    return scores
+
+def compressed_scores(method, dim, queries, corpus):
+    queries, corpus = normalize(queries[:, :dim]), normalize(corpus[:, :dim])
+    if method == "float32":
+        return queries @ corpus.T, dim * 4
+    if method == "int8":
+        codes, low, high = quantize_int8(corpus)
+        return queries @ dequantize_int8(codes, low, high).T, dim
+    if method == "binary":
+        return hamming_scores(quantize_binary(queries), quantize_binary(corpus)), dim // 8
+    raise ValueError(method)
+
+def recall(found, expected):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória x recall da compressão de vetores.")
+    parser.add_argument("--cache", default=".rag_state/embeddings.sqlite")
+    parser.add_argument("--model", default="nomic-embed-text", help="chave do modelo no cache (ex.: nomic-embed-text@batch)")
+    parser.add_argument("--synthetic", type=int, default=0, help="usa N vetores sintéticos em vez do cache")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic) if args.synthetic else load_cached_vectors(args.cache, args.model)
+    rng = np.random.default_rng(0)
+    rng.shuffle(vectors)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    full_dim = vectors.shape[1]
+    print(f"{len(corpus)} vetores de {full_dim} dimensões, {len(queries)} consultas, k={args.k}, fetch_k={args.fetch_k}\n")
+
+    full_scores = normalize(queries) @ normalize(corpus).T
+    expected = top_k(full_scores, args.k)
+
+    configs = [("float32", full_dim), ("float32", 512), ("float32", 256), ("int8", full_dim), ("int8", 256), ("binary", full_dim), ("binary", 512)]
+    print(f"{'config':>16} | {'bytes/vetor':>11} | {'memória':>10} | {'recall@k':>8} | {'re-ranqueado':>12}")
+    for method, dim in configs:
+        if dim > full_dim:
+            continue
+        scores, size = compressed_scores(method, dim, queries, corpus)
+        found = top_k(scores, args.k)
+        # Re-ranqueamento: fetch_k candidatos da busca comprimida reordenados pelos vetores completos
+        candidates = top_k(scores, args.fetch_k)
+        rescored = np.take_along_axis(full_scores, candidates, axis=1)
+        reranked = np.take_along_axis(candidates, top_k(rescored, args.k), axis=1)
+        print(f"{method + '/' + str(dim):>16} | {size:>11} | {size * len(corpus) / 1_000_000:>8.1f}MB | "
+              f"{recall(found, expected):>8.3f} | {recall(reranked, expected):>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -27,8 +27,24 @@ def create_table(conn):
     data_type TEXT NOT NULL,      -- Value type, etc.
     insights TEXT,
     recommendation TEXT,
-    responsible TEXT              -- Responsible person/position
+    responsible TEXT,             -- Responsible person/position
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
+
+   -- Tabelas criadas antes da coluna updated_at
+   ALTER TABLE knowledge_base1 ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+   -- Mantém updated_at atualizado a cada UPDATE (usado na sincronização incremental do RAG)
+   CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+   BEGIN
+       NEW.updated_at = now();
+       RETURN NEW;
+   END;
+   $$ LANGUAGE plpgsql;
+
+   DROP TRIGGER IF EXISTS knowledge_base1_set_updated_at ON knowledge_base1;
+   CREATE TRIGGER knowledge_base1_set_updated_at BEFORE UPDATE ON knowledge_base1
+       FOR EACH ROW EXECUTE FUNCTION set_updated_at();
 """
    try:
     with conn:
@@ -23,8 +23,24 @@ def create_table(conn):
     faixa_ndvi TEXT NOT NULL,
     vigor_vegetativo TEXT NOT NULL,
     indicativos TEXT NOT NULL,
-    recomendacao TEXT NOT NULL
+    recomendacao TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
     );
+
+   -- Tabelas criadas antes da coluna updated_at
+   ALTER TABLE ndvi_interpretation ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+   -- Mantém updated_at atualizado a cada UPDATE (usado na sincronização incremental do RAG)
+   CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+   BEGIN
+       NEW.updated_at = now();
+       RETURN NEW;
+   END;
+   $$ LANGUAGE plpgsql;
+
+   DROP TRIGGER IF EXISTS ndvi_interpretation_set_updated_at ON ndvi_interpretation;
+   CREATE TRIGGER ndvi_interpretation_set_updated_at BEFORE UPDATE ON ndvi_interpretation
+       FOR EACH ROW EXECUTE FUNCTION set_updated_at();
 """
    try:
     with conn:
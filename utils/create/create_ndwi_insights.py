@@ -21,8 +21,24 @@ def create_table(conn):
         id SERIAL PRIMARY KEY,
         faixa_tendencia TEXT NOT NULL,
         interpretacao TEXT NOT NULL,
-        acoes_recomendadas TEXT NOT NULL
+        acoes_recomendadas TEXT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
     );
+
+    -- Tabelas criadas antes da coluna updated_at
+    ALTER TABLE ndwi_insights ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+    -- Mantém updated_at atualizado a cada UPDATE (usado na sincronização incremental do RAG)
+    CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = now();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS ndwi_insights_set_updated_at ON ndwi_insights;
+    CREATE TRIGGER ndwi_insights_set_updated_at BEFORE UPDATE ON ndwi_insights
+        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
     """
     try:
         with conn:
@@ -21,8 +21,24 @@ def create_table(conn):
         id SERIAL PRIMARY KEY,
         faixa_osavi TEXT NOT NULL,
         cor_imagem TEXT NOT NULL,
-        interpretacao_agronomica TEXT NOT NULL
+        interpretacao_agronomica TEXT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
     );
+
+    -- Tabelas criadas antes da coluna updated_at
+    ALTER TABLE osavi_interpretation ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+    -- Mantém updated_at atualizado a cada UPDATE (usado na sincronização incremental do RAG)
+    CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = now();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS osavi_interpretation_set_updated_at ON osavi_interpretation;
+    CREATE TRIGGER osavi_interpretation_set_updated_at BEFORE UPDATE ON osavi_interpretation
+        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
     """
     try:
         with conn:
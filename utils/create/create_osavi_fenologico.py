@@ -22,8 +22,24 @@ def create_table(conn):
         estagio_fenologico TEXT NOT NULL,
         faixa_osavi TEXT NOT NULL,
         interpretacao TEXT NOT NULL,
-        aplicacoes_praticas TEXT NOT NULL
+        aplicacoes_praticas TEXT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
     );
+
+    -- Tabelas criadas antes da coluna updated_at
+    ALTER TABLE osavi_fenologico ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+    -- Mantém updated_at atualizado a cada UPDATE (usado na sincronização incremental do RAG)
+    CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = now();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS osavi_fenologico_set_updated_at ON osavi_fenologico;
+    CREATE TRIGGER osavi_fenologico_set_updated_at BEFORE UPDATE ON osavi_fenologico
+        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
     """
     try:
         with conn:
@@ -0,0 +1,96 @@
+# Backends de armazenamento vetorial atrás de insert_into_milvus() e do retriever
+# Cada backend sabe verificar, criar, abrir (como vectorstore do LangChain), apagar e expor uma coleção
+# com a interface de Collection que o pipeline usa (delete, query, schema.fields, num_entities).
+#   milvus: o servidor Milvus do podman-compose (padrão)
+#   local:  arquivos mapeados em memória em .rag_state/vectors, sem serviço externo (ver local_vectorstore.py)
+
+import os
+
+from langchain_community.vectorstores import Milvus
+from pymilvus import Collection, utility
+
+from local_vectorstore import LocalCollection, LocalVectorStore, drop_local_collection
+from milvus_schema import chunk_metadata_fields, create_chunk_collection
+
+# Mesmos campos de metadados do schema do Milvus (content_hash só com deduplicação)
+def chunk_fields(with_content_hash):
+    return [field.name for field in chunk_metadata_fields(with_content_hash)]
+
+class MilvusBackend:
+    name = "milvus"
+
+    # index_params() e search_params(collection) vêm da configuração do rag.py
+    def __init__(self, manager, index_params, search_params, num_partitions=0):
+        self.manager = manager
+        self.index_params = index_params
+        self.search_params = search_params
+        self.num_partitions = num_partitions
+
+    def connect(self):
+        self.manager.connect()
+
+    def has_collection(self, name):
+        return utility.has_collection(name)
+
+    def collection(self, name):
+        return Collection(name)
+
+    def create_collection(self, name, dim, with_content_hash=True):
+        return create_chunk_collection(name, dim, self.index_params(), with_content_hash=with_content_hash, num_partitions=self.num_partitions)
+
+    # Wrapper do LangChain para uma coleção existente, com os parâmetros de busca do índice dela
+    def open_vectorstore(self, embeddings, name):
+        return Milvus(
+            embedding_function=embeddings,
+            collection_name=name,
+            connection_args=self.manager.connection_args,
+            auto_id=True,
+            search_params=self.search_params(Collection(name)),
+        )
+
+    def drop_collection(self, name):
+        utility.drop_collection(name)
+
+    def load(self, name):
+        self.manager.load(name)
+
+class LocalBackend:
+    name = "local"
+
+    # nlist > 0 ativa o quantizador IVF quando a coleção tiver vetores suficientes; nprobe listas por busca
+    def __init__(self, path=".rag_state/vectors", metric="L2", nlist=0, nprobe=8):
+        self.path = path
+        self.metric = metric
+        self.nlist = nlist
+        self.nprobe = nprobe
+        # Uma instância por coleção no processo: vectorstore, remoções e consultas veem o mesmo estado
+        self.collections = {}
+
+    def connect(self):
+        pass
+
+    def _path(self, name):
+        return os.path.join(self.path, name)
+
+    def has_collection(self, name):
+        return os.path.exists(os.path.join(self._path(name), "collection.json"))
+
+    def collection(self, name):
+        if name not in self.collections:
+            self.collections[name] = LocalCollection(self._path(name))
+        return self.collections[name]
+
+    def create_collection(self, name, dim, with_content_hash=True):
+        self.collections[name] = LocalCollection.create(self._path(name), dim, chunk_fields(with_content_hash), self.metric)
+        return self.collections[name]
+
+    def open_vectorstore(self, embeddings, name):
+        return LocalVectorStore(embeddings, self.collection(name), nlist=self.nlist, nprobe=self.nprobe)
+
+    def drop_collection(self, name):
+        self.collections.pop(name, None)
+        drop_local_collection(self._path(name))
+
+    # Os vetores já são lidos do mapa de memória sob demanda
+    def load(self, name):
+        self.collection(name)
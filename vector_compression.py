@@ -0,0 +1,77 @@
+# Compressão dos vetores guardados no Milvus e re-ranqueamento com precisão total
+# - Matryoshka: o nomic-embed-text concentra a informação nas primeiras dimensões, então guardar só
+#   as primeiras 256/512 (renormalizadas) reduz a memória do índice em 3x/1,5x.
+# - int8: feito pelo próprio Milvus com o índice IVF_SQ8 (cada dimensão vira 1 byte).
+# - binário: 1 bit por dimensão; medido no relatório utils/bench/bench_vector_compression.py.
+# A busca comprimida traz fetch_k candidatos e o RescoringRetriever os reordena pelo cosseno com os
+# vetores completos, que vêm do cache de embeddings (sem nova chamada ao Ollama).
+
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+# Primeiras dim dimensões com norma 1; dim 0 devolve o vetor como veio, sem renormalizar, para a
+# consulta ficar na mesma escala dos vetores guardados sem truncagem
+def truncate_vector(vector, dim):
+    if not dim:
+        return list(vector)
+    vector = np.asarray(vector, dtype=np.float32)[:dim]
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+# Quantização escalar por dimensão, como no IVF_SQ8: devolve os códigos uint8 e a faixa usada
+def quantize_int8(vectors, low=None, high=None):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    low = vectors.min(axis=0) if low is None else low
+    high = vectors.max(axis=0) if high is None else high
+    scale = np.where(high > low, high - low, 1.0)
+    codes = np.clip(np.rint((vectors - low) / scale * 255), 0, 255).astype(np.uint8)
+    return codes, low, high
+
+def dequantize_int8(codes, low, high):
+    scale = np.where(high > low, high - low, 1.0)
+    return codes.astype(np.float32) / 255 * scale + low
+
+# Um bit por dimensão (sinal), empacotado em bytes como espera o BINARY_VECTOR do Milvus
+def quantize_binary(vectors):
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+def cosine_scores(query_vector, vectors):
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+    return vectors @ query_vector / np.where(norms > 0, norms, 1.0)
+
+# Embeddings truncados às primeiras dim dimensões (documentos e consultas)
+class TruncatedEmbeddings(Embeddings):
+    def __init__(self, embeddings, dim):
+        self.embeddings = embeddings
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        return [truncate_vector(vector, self.dim) for vector in self.embeddings.embed_documents(texts)]
+
+    def embed_query(self, text):
+        return truncate_vector(self.embeddings.embed_query(text), self.dim)
+
+# Busca fetch_k candidatos no índice comprimido e devolve os k melhores pelos vetores completos;
+# search_kwargs (ex.: param com nprobe/ef) podem ser trocados por consulta em invoke(query, param=...)
+class RescoringRetriever(BaseRetriever):
+    vectorstore: Any
+    embeddings: Any
+    dim: int = 0
+    k: int = 4
+    fetch_k: int = 20
+    search_kwargs: dict = {}
+
+    def _get_relevant_documents(self, query, *, run_manager=None, **kwargs):
+        query_vector = self.embeddings.embed_query(query)
+        candidates = self.vectorstore.similarity_search_by_vector(
+            truncate_vector(query_vector, self.dim), k=self.fetch_k, **{**self.search_kwargs, **kwargs}
+        )
+        if len(candidates) <= 1:
+            return candidates
+        scores = cosine_scores(query_vector, self.embeddings.embed_documents([doc.page_content for doc in candidates]))
+        return [candidates[i] for i in np.argsort(-scores, kind="stable")[:self.k]]